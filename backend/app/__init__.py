@@ -4,23 +4,82 @@ from flask_migrate import Migrate
 from flask_cors import CORS
 from config import Config
 import time
-from app.logging_config import get_logger, generate_correlation_id
+from app.logging_config import get_logger, generate_correlation_id, sampled
+from app.db_routing import REPLICA_BIND, RoutingSession, engine_options
 
 # Initialize logger
 logger = get_logger(__name__)
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Engine options per database, so an in-memory primary or replica gets no queue pool sizing
+    pool_options = app.config.get('DB_POOL_OPTIONS', {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(app.config['SQLALCHEMY_DATABASE_URI'], pool_options),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {
+            **app.config.get('SQLALCHEMY_BINDS', {}),
+            REPLICA_BIND: {'url': replica_url, **engine_options(replica_url, pool_options)}
+        }
+    
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
     CORS(app)
     
+    from app.services.metrics import metrics, http_requests, http_request_duration
+    metrics.init_app(app)
+    
+    from app.services.tracing import tracer
+    tracer.init_app(app)
+    
+    from app.query_stats import query_stats
+    query_stats.init_app(app)
+    
+    from app.services.http_client import llm_client
+    llm_client.init_app(app)
+    
+    from app.services.replica_pool import replica_router
+    replica_router.init_app(app)
+    
+    from app.services.history_cache import chat_history_cache
+    chat_history_cache.init_app(app)
+    
+    from app.services.progress import evaluation_progress
+    evaluation_progress.init_app(app)
+
+    from app.services.context_window import context_window
+    context_window.init_app(app)
+    
+    from app.services.response_cache import response_cache
+    response_cache.init_app(app)
+    
+    from app.services.admission import admission_control
+    admission_control.init_app(app)
+    
+    from app.services.message_writer import message_writer
+    message_writer.init_app(app)
+
+    from app.services.job_queue import generation_queue
+    generation_queue.init_app(app)
+
+    from app.services.openers import opener_pool
+    opener_pool.init_app(app)
+
+    from app.services.question_catalog import question_catalog
+    question_catalog.init_app(app)
+
+    from app.services.analytics import analytics
+    analytics.init_app(app)
+    
     # Register blueprints
     from app.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
@@ -32,6 +91,24 @@ def create_app(config_class=Config):
         g.correlation_id = request.headers.get('X-Correlation-ID') or generate_correlation_id()
         g.request_id = generate_correlation_id()
         g.start_time = time.time()
+        query_stats.start_request()
+        # Not only on the first enqueue: jobs left queued by a restart run once anyone polls them
+        generation_queue.start()
+        
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.trace = tracer.start_trace(f"{request.method} {rule}", g.correlation_id, **{
+            'http.method': request.method,
+            'http.route': rule,
+            'http.target': request.full_path.rstrip('?'),
+            'request_id': g.request_id
+        })
+        
+        # Successful, fast requests are only logged when sampled; decide up front so both lines agree
+        g.log_sampled = sampled(g.correlation_id, app.config['REQUEST_LOG_SAMPLE_RATES'].get(
+            rule, app.config['REQUEST_LOG_SAMPLE_RATE']
+        ))
+        if not g.log_sampled:
+            return
         
         # Log incoming request
         logger.info(
@@ -41,6 +118,7 @@ def create_app(config_class=Config):
                 'path': request.path,
                 'remote_addr': request.remote_addr,
                 'query_params': dict(request.args),
+                'sample_reason': 'sampled'
             }
         )
     
@@ -48,17 +126,45 @@ def create_app(config_class=Config):
     def after_request(response):
         # Calculate request duration
         duration = time.time() - g.get('start_time', time.time())
+        duration_ms = round(duration * 1000, 2)
+        queries = query_stats.finish_request(response)
         
-        # Log response
-        logger.info(
-            f"Request completed: {request.method} {request.path}",
-            extra={
-                'method': request.method,
-                'path': request.path,
-                'status_code': response.status_code,
-                'duration_ms': round(duration * 1000, 2)
-            }
-        )
+        # Record metrics by route rule, so ids in URLs don't create new series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_requests.inc(route=route, method=request.method, status=response.status_code)
+        http_request_duration.observe(duration, route=route, method=request.method)
+        
+        # Log response; failed and slow requests always, the others when sampled
+        if response.status_code >= app.config['REQUEST_LOG_ALWAYS_STATUS']:
+            sample_reason = 'error'
+        elif duration_ms >= app.config['REQUEST_LOG_SLOW_MS']:
+            sample_reason = 'slow'
+        elif g.get('log_sampled', True):
+            sample_reason = 'sampled'
+        else:
+            sample_reason = None
+        if sample_reason:
+            logger.info(
+                f"Request completed: {request.method} {request.path}",
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status_code': response.status_code,
+                    'duration_ms': duration_ms,
+                    'db_statements': queries.count,
+                    'db_time_ms': round(queries.seconds * 1000, 2),
+                    'sample_reason': sample_reason
+                }
+            )
+        
+        # The trace ends when the response is closed, after any streamed body
+        trace = g.get('trace')
+        if trace is not None:
+            trace.root.set_attribute('http.status_code', response.status_code)
+            trace.root.set_attribute('db.statements', queries.count)
+            if response.status_code >= 500:
+                trace.root.error = f"HTTP {response.status_code}"
+            response.call_on_close(lambda: tracer.finish_trace(trace))
         
         # Add correlation ID to response headers
         response.headers['X-Correlation-ID'] = g.get('correlation_id')
@@ -85,7 +191,7 @@ def create_app(config_class=Config):
     # Add health check endpoint
     @app.route('/api/health')
     def health_check():
-        logger.info("Health check performed")
+        logger.debug("Health check performed")
         return {"status": "healthy"}, 200
     
     logger.info("Application initialized", extra={"environment": app.config.get("FLASK_ENV", "development")})
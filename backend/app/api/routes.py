@@ -1,10 +1,27 @@
-from flask import jsonify, request, g
-import asyncio
+from flask import current_app, jsonify, request, g, Response as FlaskResponse, stream_with_context
+import hmac
+import json
+import tempfile
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
 from app import db
 from app.api import bp
-from app.models import LanguageModel, User, Evaluation, Question, Response, ChatMessage, PromptType, UseCase, ChatSession
+from app.db_routing import read_only, replica_reads
+from app.query_stats import query_budget
+from app.models import LanguageModel, User, Evaluation, Response, PromptType, UseCase, ChatSession, GenerationJob, ResponseSummary
 from app.services.chat_service import ChatService
 from app.services.randomization import RandomizationService
+from app.services.history_cache import chat_history_cache
+from app.services.job_queue import generation_queue
+from app.services.message_writer import message_writer
+from app.services.openers import opener_pool
+from app.services.progress import evaluation_progress
+from app.services.question_catalog import SURVEY_TYPES, question_catalog
+from app.services.admission import AdmissionRejected, admission_control
+from app.services import export, response_summary
+from app.services.analytics import GROUP_COLUMNS, analytics
+from app.services.metrics import metrics
+from app.services.tracing import tracer
 from datetime import datetime
 import uuid
 from app.logging_config import get_logger, log_exception
@@ -14,32 +31,46 @@ logger = get_logger(__name__)
 from app.services.system_prompts import get_prompt_goal
 
 @bp.route('/questions', methods=['GET'])
+@query_budget(2)
+@read_only
 def get_questions():
-    survey_type = request.args.get('type', 'pre')  # 'pre' or 'post'
-    questions = Question.query.filter_by(
-        active=True,
-        survey_type=survey_type
-    ).order_by(Question.order).all()
+    survey_type = request.args.get('type', 'pre')
+    if survey_type not in SURVEY_TYPES:
+        return jsonify({'error': f"Unknown survey type: {survey_type}"}), 400
+    survey = question_catalog.survey(survey_type)
     
-    return jsonify({
-        'questions': [q.to_dict() for q in questions]
-    })
+    # Served from the pre-serialized catalog; clients revalidate with If-None-Match and usually get a 304
+    response = FlaskResponse(survey.body, mimetype='application/json')
+    response.set_etag(survey.etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def _likert_value(answer):
+    """The integer value of a Likert answer, or None if it is not a whole number."""
+    if isinstance(answer, bool):
+        return None
+    if isinstance(answer, int):
+        return answer
+    if isinstance(answer, float):
+        return int(answer) if answer.is_integer() else None
+    try:
+        return int(str(answer).strip())
+    except ValueError:
+        return None
 
 @bp.route('/responses', methods=['POST'])
+@query_budget(6)
 def submit_responses():
     data = request.json
     chat_session_id = data.get('chat_session_id')
     eval_id = data.get('eval_id')
     responses_data = data.get('responses', [])
     survey_type = data.get('type', 'pre')
+    if survey_type not in SURVEY_TYPES:
+        return jsonify({'error': f"Unknown survey type: {survey_type}"}), 400
     
     # Validate required questions
-    required_questions = Question.query.filter_by(
-        active=True,
-        required=True,
-        survey_type=survey_type
-    ).all()
-    required_ids = {q.id for q in required_questions}
+    required_ids = question_catalog.required_ids(survey_type)
     submitted_ids = {r['questionId'] for r in responses_data}
     
     missing_required = required_ids - submitted_ids
@@ -58,25 +89,56 @@ def submit_responses():
             'missing_questions': list(missing_required)
         }), 400
     
-    # Store responses
+    # Check Likert answers up front; a bad one must not fail the insert halfway with a 500
+    likert_ids = question_catalog.survey(survey_type).likert_ids
+    likert_answers = {}
+    invalid_answers = []
     for response_data in responses_data:
-        response = Response(
-            question_id=response_data['questionId'],
-            chat_session_id=chat_session_id,
-            eval_id=eval_id,
-            answer=str(response_data['answer'])
+        if response_data['questionId'] in likert_ids:
+            value = _likert_value(response_data.get('answer'))
+            if value is None:
+                invalid_answers.append(response_data['questionId'])
+            else:
+                likert_answers[response_data['questionId']] = value
+    if invalid_answers:
+        logger.warning(
+            f"Invalid Likert answers in {survey_type} survey submission",
+            extra={
+                'invalid_questions': invalid_answers,
+                'survey_type': survey_type,
+                'correlation_id': g.get('correlation_id')
+            }
         )
-        db.session.add(response)
-    
-    # Update chat session if post-survey
-    if survey_type == 'post':
-        chat_session = ChatSession.query.get(chat_session_id)
-        if chat_session:
-            chat_session.end_time = datetime.utcnow()
-            chat_session.completed = True
+        return jsonify({
+            'error': 'Likert answers must be whole numbers',
+            'invalid_questions': invalid_answers
+        }), 400
     
+    completed_session = None
     try:
+        # Store responses as one multi-row insert instead of an ORM object per answer
+        if responses_data:
+            db.session.execute(insert(Response), [{
+                'question_id': response_data['questionId'],
+                'chat_session_id': chat_session_id,
+                'eval_id': eval_id,
+                'answer': str(response_data['answer'])
+            } for response_data in responses_data])
+        
+        # Update chat session and the per-cell summary if post-survey
+        if survey_type == 'post' and chat_session_id is not None:
+            completed_session = evaluation_progress.session_config(chat_session_id)
+            if completed_session:
+                ChatSession.query.filter_by(id=completed_session.id).update(
+                    {'end_time': datetime.utcnow(), 'completed': True},
+                    synchronize_session=False
+                )
+                response_summary.record_answers(completed_session, likert_answers)
+                chat_history_cache.invalidate(completed_session.id)
+        
         db.session.commit()
+        if completed_session:
+            evaluation_progress.session_completed(completed_session)
         return jsonify({'status': 'success'})
     except Exception as e:
         db.session.rollback()
@@ -89,6 +151,7 @@ def submit_responses():
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/session', methods=['POST'])
+@query_budget(1)
 def create_session():
     """Create a new session with randomized configuration"""
     session_id = str(uuid.uuid4())
@@ -98,6 +161,7 @@ def create_session():
     return jsonify({'session_id': session_id})
 
 @bp.route('/evaluation', methods=['POST'])
+@query_budget(3)
 def start_evaluation():
     """Start a new evaluation with a language model"""
     session_id = request.json.get('session_id')
@@ -115,6 +179,7 @@ def start_evaluation():
     })
 
 @bp.route('/chat/session', methods=['POST'])
+@query_budget(12)
 def start_chat_session():
     """Start a new chat session for a specific use case"""
     evaluation_id = request.json.get('evaluation_id')
@@ -145,6 +210,10 @@ def start_chat_session():
     )
     db.session.add(chat_session)
     db.session.commit()
+    evaluation_progress.session_started(chat_session)
+    
+    # The bot opens the conversation; its first message is ready or generating before the client asks
+    opening_job = opener_pool.start_opening(chat_session)
     
     return jsonify({
         'chat_session_id': chat_session.id,
@@ -153,33 +222,26 @@ def start_chat_session():
             'prompt_type': prompt_type.value,
             'user_goal': user_goal,
             'language_model': language_model.value
-        }
+        },
+        'opening': opening_job.to_dict()
     })
 
 @bp.route('/chat/message', methods=['POST'])
+@query_budget(6)
 def process_chat_message():
     """Process chat messages using the chat session's configuration"""
     try:
         data = request.json
         chat_session_id = data.get('chatSessionId')
         message_content = data.get('message')
-        chat_history = data.get('history', [])
         
         if not message_content:
             return jsonify({'error': 'Message content is required'}), 400
         
-        # Get chat session and evaluation configuration
-        chat_session = ChatSession.query.get_or_404(chat_session_id)
-        evaluation = Evaluation.query.get_or_404(chat_session.evaluation_id)
-        
-        # Store user message
-        user_message = ChatMessage(
-            chat_session_id=chat_session_id,
-            sender='user',
-            content=message_content
-        )
-        db.session.add(user_message)
-        db.session.commit()
+        # Get the chat session's configuration, cached after its first lookup
+        chat_session = evaluation_progress.session_config(chat_session_id)
+        if chat_session is None:
+            return jsonify({'success': False, 'error': 'Chat session not found'}), 404
         
         # Initialize chat service with configuration
         chat_service = ChatService(
@@ -188,24 +250,28 @@ def process_chat_message():
             prompt_type=PromptType(chat_session.prompt_type)
         )
         
-        # Add user message to chat history
-        chat_history.append({
-            'role': 'user',
-            'content': message_content
-        })
-        
-        # Process with configured service
-        result = asyncio.run(chat_service.process_chat(chat_history))
+        # Reserve a model slot before storing anything, so overload is rejected cheaply
+        with admission_control.acquire(chat_service.language_model):
+            # Rebuild the history server-side instead of trusting the client
+            chat_history = chat_history_cache.get(chat_session.id)
+            
+            # Store user message
+            user_message = message_writer.write(chat_session.id, 'user', message_content)
+            chat_history_cache.record(user_message)
+            
+            # Add user message to chat history
+            chat_history.append({
+                'role': 'user',
+                'content': message_content
+            })
+            
+            # Process with configured service
+            result = chat_service.process_chat_sync(chat_history)
         
         if result['success']:
             # Store bot response
-            bot_message = ChatMessage(
-                chat_session_id=chat_session_id,
-                sender='bot',
-                content=result['content']
-            )
-            db.session.add(bot_message)
-            db.session.commit()
+            bot_message = message_writer.write(chat_session.id, 'bot', result['content'])
+            chat_history_cache.record(bot_message)
             
             return jsonify({
                 'success': True,
@@ -229,8 +295,13 @@ def process_chat_message():
         return jsonify({
             'success': False,
             'error': result['error']
-        }), 500
+        }), 503 if result.get('unavailable') else 500
         
+    except AdmissionRejected as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 429, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         db.session.rollback()
         log_exception(logger, e, {
@@ -242,20 +313,135 @@ def process_chat_message():
             'error': str(e)
         }), 500
 
+@bp.route('/chat/message/stream', methods=['POST'])
+@query_budget(4)
+def stream_chat_message():
+    """Stream the bot reply as NDJSON events while the model generates it"""
+    data = request.json
+    chat_session_id = data.get('chatSessionId')
+    message_content = data.get('message')
+    
+    if not message_content:
+        return jsonify({'error': 'Message content is required'}), 400
+    
+    chat_session = evaluation_progress.session_config(chat_session_id)
+    if chat_session is None:
+        return jsonify({'error': 'Chat session not found'}), 404
+    
+    chat_service = ChatService(
+        language_model=LanguageModel(chat_session.language_model),
+        use_case=UseCase(chat_session.use_case),
+        prompt_type=PromptType(chat_session.prompt_type)
+    )
+    
+    # Reserve a model slot before storing anything; it is held until the stream ends
+    try:
+        slot = admission_control.acquire(chat_service.language_model)
+    except AdmissionRejected as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+    
+    try:
+        # Rebuild the history server-side instead of trusting the client
+        chat_history = chat_history_cache.get(chat_session.id)
+        
+        # Store user message before the stream starts
+        user_message = message_writer.write(chat_session.id, 'user', message_content)
+        chat_history_cache.record(user_message)
+    except Exception:
+        slot.release()
+        raise
+    
+    chat_history.append({
+        'role': 'user',
+        'content': message_content
+    })
+    correlation_id = g.get('correlation_id')
+    session_id = chat_session.id
+    
+    def generate():
+        for event in chat_service.stream_chat(chat_history):
+            if event['type'] == 'done':
+                try:
+                    # Persist the bot reply once the stream has ended
+                    bot_message = message_writer.write(session_id, 'bot', event['content'])
+                    chat_history_cache.record(bot_message)
+                    event = {
+                        'type': 'done',
+                        'message': {
+                            'id': bot_message.id,
+                            'content': bot_message.content,
+                            'reasoning': event['reasoning'],
+                            'timestamp': bot_message.timestamp.isoformat()
+                        }
+                    }
+                except Exception as e:
+                    db.session.rollback()
+                    log_exception(logger, e, {
+                        'chat_session_id': chat_session_id,
+                        'correlation_id': correlation_id
+                    })
+                    event = {'type': 'error', 'error': str(e)}
+            elif event['type'] == 'error':
+                logger.error(
+                    "Failed to stream chat message",
+                    extra={
+                        'error': event['error'],
+                        'chat_session_id': chat_session_id,
+                        'correlation_id': correlation_id
+                    }
+                )
+            
+            yield json.dumps(event) + '\n'
+    
+    response = FlaskResponse(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Released once the server closes the response, even if the client disconnects early
+    response.call_on_close(slot.release)
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@bp.route('/chat/jobs', methods=['POST'])
+@query_budget(5)
+def submit_chat_job():
+    """Store the user message and queue the bot reply; poll the returned job for the result"""
+    data = request.json
+    chat_session_id = data.get('chatSessionId')
+    message_content = data.get('message')
+    
+    if not message_content:
+        return jsonify({'error': 'Message content is required'}), 400
+    
+    chat_session = evaluation_progress.session_config(chat_session_id)
+    if chat_session is None:
+        return jsonify({'error': 'Chat session not found'}), 404
+    
+    user_message = message_writer.write(chat_session.id, 'user', message_content)
+    chat_history_cache.record(user_message)
+    
+    job = generation_queue.enqueue(chat_session.id, user_message.id)
+    
+    return jsonify(job.to_dict()), 202
+
+@bp.route('/chat/jobs/<job_id>', methods=['GET'])
+@query_budget(2)
+def get_chat_job(job_id):
+    """Get the status of a queued bot reply, including the message once it is done"""
+    job = GenerationJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
 @bp.route('/chat/next-topic', methods=['GET'])
+@query_budget(1)
+@read_only
 def get_next_topic():
     """Get the next available topic for an evaluation"""
-    evaluation_id = request.args.get('evaluation_id')
+    evaluation_id = request.args.get('evaluation_id', type=int)
     
     # Get all use cases
     all_use_cases = [uc.value for uc in UseCase]
     
-    # Get completed use cases for this evaluation
-    completed_sessions = ChatSession.query.filter_by(
-        evaluation_id=evaluation_id,
-        completed=True
-    ).all()
-    completed_use_cases = [session.use_case for session in completed_sessions]
+    # Get completed use cases for this evaluation from its cached progress record
+    completed_use_cases = evaluation_progress.completed_use_cases(evaluation_id)
     
     # Find remaining use cases
     remaining_use_cases = [uc for uc in all_use_cases if uc not in completed_use_cases]
@@ -273,43 +459,154 @@ def get_next_topic():
     })
 
 @bp.route('/results/<int:evaluation_id>', methods=['GET'])
+@query_budget(4)
+@read_only
 def get_results(evaluation_id):
     """Get evaluation results including all chat sessions"""
-    evaluation = Evaluation.query.get_or_404(evaluation_id)
-    
-    # Get all chat sessions for this evaluation
-    chat_sessions = ChatSession.query.filter_by(evaluation_id=evaluation_id).all()
+    # Sessions, their responses and their messages are each fetched in one batched query,
+    # so the number of queries stays the same however many sessions there are
+    evaluation = Evaluation.query.options(
+        selectinload(Evaluation.chat_sessions).selectinload(ChatSession.responses),
+        selectinload(Evaluation.chat_sessions).selectinload(ChatSession.chat_messages)
+    ).filter_by(id=evaluation_id).first_or_404()
     
     sessions_data = []
-    for session in chat_sessions:
-        # Get responses for this chat session
-        responses = Response.query.filter_by(chat_session_id=session.id).all()
-        
-        # Get chat messages for this session
-        messages = ChatMessage.query.filter_by(chat_session_id=session.id).all()
-        
+    for session in sorted(evaluation.chat_sessions, key=lambda s: s.id):
         sessions_data.append({
             'id': session.id,
             'use_case': session.use_case,
+            'language_model': session.language_model,
             'prompt_type': session.prompt_type,
             'start_time': session.start_time.isoformat(),
             'end_time': session.end_time.isoformat() if session.end_time else None,
             'completed': session.completed,
-            'responses': [r.to_dict() for r in responses],
+            'responses': [r.to_dict() for r in session.responses],
             'chat_messages': [{
                 'id': msg.id,
                 'sender': msg.sender,
                 'content': msg.content,
                 'timestamp': msg.timestamp.isoformat()
-            } for msg in messages]
+            } for msg in session.chat_messages]
         })
     
     results = {
         'evaluation_id': evaluation.id,
-        'language_model': evaluation.language_model,
         'start_time': evaluation.start_time.isoformat(),
         'end_time': evaluation.end_time.isoformat() if evaluation.end_time else None,
         'chat_sessions': sessions_data
     }
     
     return jsonify(results)
+
+@bp.route('/analytics', methods=['GET'])
+@query_budget(4)
+@read_only
+def get_analytics():
+    """Post-survey Likert statistics per (model, prompt type, use case) cell, with prompt type comparisons"""
+    group_by = [name for name in request.args.get('group_by', ','.join(GROUP_COLUMNS)).split(',') if name]
+    unknown = [name for name in group_by if name not in GROUP_COLUMNS]
+    if unknown:
+        return jsonify({'error': f"Unknown group_by columns: {', '.join(unknown)}"}), 400
+    bootstrap_samples = request.args.get('bootstrap', type=int)
+    if bootstrap_samples is not None and not 0 <= bootstrap_samples <= 100000:
+        return jsonify({'error': 'bootstrap must be between 0 and 100000'}), 400
+    
+    return jsonify(analytics.summary(group_by, bootstrap_samples))
+
+@bp.route('/analytics/summary', methods=['GET'])
+@query_budget(1)
+@read_only
+def get_analytics_summary():
+    """Running post-survey Likert totals per cell and question, optionally filtered by cell columns"""
+    filters = {name: request.args[name] for name in GROUP_COLUMNS if request.args.get(name)}
+    if request.args.get('question_id'):
+        filters['question_id'] = request.args.get('question_id', type=int)
+    rows = ResponseSummary.query.filter_by(**filters).all()
+    return jsonify({'cells': [row.to_dict() for row in rows]})
+
+@bp.route('/export', methods=['GET'])
+def export_data():
+    """Stream every user, evaluation, chat session, message and response as NDJSON, CSV or Parquet"""
+    token = current_app.config.get('EXPORT_TOKEN')
+    if not token:
+        return jsonify({'error': 'Export is disabled; set EXPORT_TOKEN or use flask export-data'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Invalid export token'}), 401
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in export.FORMATS:
+        return jsonify({'error': f"Unknown format, use one of {', '.join(export.FORMATS)}"}), 400
+    tables = request.args.getlist('table') or list(export.EXPORT_TABLES)
+    unknown = [table for table in tables if table not in export.EXPORT_TABLES]
+    if unknown:
+        return jsonify({'error': f"Unknown tables: {', '.join(unknown)}"}), 400
+    if export_format != 'ndjson' and len(tables) != 1:
+        return jsonify({'error': f'{export_format} exports one table at a time; pass table='}), 400
+    try:
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO 8601 timestamp'}), 400
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    
+    if export_format == 'parquet':
+        # Parquet's footer comes last, so spool to a temporary file and stream that
+        spool = tempfile.TemporaryFile()
+        try:
+            with replica_reads():
+                export.write_parquet(tables[0], spool, since, batch_size)
+        except RuntimeError as e:
+            spool.close()
+            return jsonify({'error': str(e)}), 501
+        spool.seek(0)
+        
+        def chunks():
+            with spool:
+                while chunk := spool.read(64 * 1024):
+                    yield chunk
+        
+        return FlaskResponse(chunks(), mimetype='application/vnd.apache.parquet', headers={
+            'Content-Disposition': f'attachment; filename={tables[0]}.parquet'
+        })
+    
+    def generate():
+        with replica_reads():
+            if export_format == 'csv':
+                yield from export.iter_csv(tables[0], since, batch_size)
+            else:
+                yield from export.iter_ndjson(tables, since, batch_size)
+    
+    filename = f'{tables[0]}.csv' if export_format == 'csv' else 'export.ndjson'
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return FlaskResponse(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _observability_denied():
+    """The error response for a metrics or traces call without the OBSERVABILITY_TOKEN bearer token, else None."""
+    token = current_app.config.get('OBSERVABILITY_TOKEN')
+    if not token:
+        return jsonify({'error': 'Observability endpoints are disabled; set OBSERVABILITY_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Invalid observability token'}), 401
+    return None
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request, LLM and database metrics of all backend processes, in the Prometheus text format."""
+    denied = _observability_denied()
+    if denied:
+        return denied
+    return FlaskResponse(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.route('/traces', methods=['GET'])
+def get_traces():
+    """The request traces last kept by the worker that serves this call, as OTLP JSON documents."""
+    denied = _observability_denied()
+    if denied:
+        return denied
+    documents = tracer.recent(request.args.get('trace_id') or request.args.get('correlation_id'))
+    limit = request.args.get('limit', type=int)
+    if limit:
+        documents = documents[-limit:]
+    return jsonify({'traces': documents})
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+# Bind key of the optional read replica in SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+# Engine options only a QueuePool accepts
+_QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+def engine_options(url, pool_options: dict) -> dict:
+    """
+    The pool options that suit the engine of a database URL.
+
+    In-memory SQLite databases get a StaticPool, which rejects the queue
+    pool's sizing options, so those are left out for them.
+
+    Args:
+        url: The database URL.
+        pool_options: The configured DB_POOL_OPTIONS.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {key: value for key, value in pool_options.items() if key not in _QUEUE_POOL_OPTIONS}
+    return dict(pool_options)
+
+class RoutingSession(Session):
+    """
+    Session that sends the queries of read_only routes to the read replica.
+
+    Everything else, and anything flushed, goes to the primary. Without a
+    replica bind configured it behaves exactly like the default session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('read_replica'):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@contextmanager
+def replica_reads():
+    """Send the session's queries to the read replica, if there is one, within the block."""
+    previous = g.get('read_replica', False)
+    g.read_replica = True
+    try:
+        yield
+    finally:
+        g.read_replica = previous
+
+def read_only(view):
+    """Route decorator: serve the view's queries from the read replica, if there is one."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
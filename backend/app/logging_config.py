@@ -1,35 +1,259 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import threading
+import time
 import uuid
 import traceback
+import zlib
+from collections import OrderedDict
 from datetime import datetime
-from flask import request, g
+from flask import request, g, has_request_context
 from pythonjsonlogger import jsonlogger
 
 # Configure log levels based on environment
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
 ENVIRONMENT = os.environ.get('FLASK_ENV', 'development')
 
+# Queue mode: records are handed to a background writer instead of being written by the logging thread
+LOG_QUEUE_ENABLED = os.environ.get('LOG_QUEUE_ENABLED', 'false').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 256))
+LOG_SHUTDOWN_TIMEOUT = float(os.environ.get('LOG_SHUTDOWN_TIMEOUT', 5))
+
+# Identical messages beyond a burst are limited to this many per second (0 disables)
+LOG_RATE_LIMIT = float(os.environ.get('LOG_RATE_LIMIT', 10))
+LOG_RATE_BURST = float(os.environ.get('LOG_RATE_BURST', 20))
+
+def _request_info():
+    info = {
+        'remote_addr': request.remote_addr,
+        'method': request.method,
+        'path': request.path
+    }
+    for key in ('correlation_id', 'request_id'):
+        value = g.get(key)
+        if value is not None:
+            info[key] = value
+    return info
+
 # Custom JSON formatter with additional fields
 class CustomJsonFormatter(jsonlogger.JsonFormatter):
     def add_fields(self, log_record, record, message_dict):
         super(CustomJsonFormatter, self).add_fields(log_record, record, message_dict)
         
-        # Add timestamp
-        log_record['timestamp'] = datetime.utcnow().isoformat()
+        # Add timestamp of when the record was made, which may be before it is formatted
+        log_record['timestamp'] = datetime.utcfromtimestamp(record.created).isoformat()
         log_record['level'] = record.levelname
         log_record['environment'] = ENVIRONMENT
         
-        # Add request info if available
-        if request:
+        # Add request info, captured by QueueLogHandler or read from the current request
+        request_info = log_record.pop('request_info', None)
+        if request_info is None and has_request_context():
+            request_info = _request_info()
+        if request_info:
+            log_record.update(request_info)
+
+class RateLimitFilter(logging.Filter):
+    """
+    Collapses identical repeated messages with a token bucket per message.
+
+    Each distinct (logger, level, message) may log `burst` records at once
+    and `rate` per second after that; the rest are dropped, and the next
+    record that passes carries the number dropped in its 'suppressed'
+    field. Errors and the request middleware's start and completion lines,
+    which carry a 'sample_reason' and are already thinned by sampling, are
+    never limited.
+    """
+
+    def __init__(self, rate: float, burst: float, max_messages: int = 1024):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_messages = max_messages
+        self._buckets: "OrderedDict[tuple, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno >= logging.ERROR or hasattr(record, 'sample_reason'):
+            return True
+
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # [tokens, last refill, records dropped since the last one logged]
+                bucket = self._buckets[key] = [self.burst, now, 0]
+                if len(self._buckets) > self.max_messages:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+def sampled(key: str, percent: float) -> bool:
+    """
+    Decide whether to log something sampled at the given percentage.
+
+    The decision is a hash of the key, so passing a correlation ID samples
+    every request of a correlated flow alike.
+    """
+    if percent >= 100:
+        return True
+    if percent <= 0:
+        return False
+    return zlib.crc32(key.encode('utf-8')) % 10000 < percent * 100
+
+class _LogWriter:
+    """
+    Background thread that formats queued records and writes them in batches.
+
+    Everything queued is written with a single write and flush per batch of
+    up to batch_size records. The queue is bounded; records that do not fit
+    are dropped and counted, and the count is reported in the next batch.
+    A process started by fork gets its own queue and thread on first use.
+    """
+
+    def __init__(self, stream, queue_size: int, batch_size: int):
+        self.handler = logging.StreamHandler(stream)
+        self.handler.setFormatter(CustomJsonFormatter('%(timestamp)s %(level)s %(name)s %(message)s'))
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._reported = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(self.queue_size)
+                self.dropped = self._reported = 0
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def put(self, record: logging.LogRecord):
+        if self._stopped and self._pid == os.getpid():
+            # Shutting down; nothing reads the queue anymore
+            self._write([record])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        log_queue = self._queue
+        while True:
+            batch = [log_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            self._write([record for record in batch if record is not None])
+            if stopping:
+                return
+
+    def _write(self, records):
+        dropped = self.dropped - self._reported
+        if dropped:
+            self._reported += dropped
+            records.append(logging.makeLogRecord({
+                'name': __name__,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': f"Dropped {dropped} log records, log queue full",
+                'dropped_records': dropped
+            }))
+
+        lines = []
+        for record in records:
             try:
-                log_record['remote_addr'] = request.remote_addr
-                log_record['method'] = request.method
-                log_record['path'] = request.path
-            except:
-                # Request context might not be available
-                pass
+                lines.append(self.handler.format(record))
+            except Exception:
+                self.handler.handleError(record)
+        if not lines:
+            return
+        self.handler.acquire()
+        try:
+            self.handler.stream.write('\n'.join(lines) + '\n')
+            self.handler.flush()
+        except Exception:
+            self.handler.handleError(records[-1])
+        finally:
+            self.handler.release()
+
+    def stop(self, timeout: float):
+        """Write everything queued so far and stop the thread."""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._stopped = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the _LogWriter, keeping formatting and I/O off the calling thread.
+
+    Only what would change or disappear before the writer gets to the record
+    is resolved here: the message arguments, the exception and the request.
+    """
+
+    def __init__(self, writer: _LogWriter):
+        super().__init__(None)
+        self.writer = writer
+
+    def prepare(self, record):
+        if not isinstance(record.msg, dict):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = self.writer.handler.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.request_info = _request_info() if has_request_context() else None
+        return record
+
+    def enqueue(self, record):
+        self.writer.put(record)
+
+_log_writer = _LogWriter(sys.stdout, LOG_QUEUE_SIZE, LOG_BATCH_SIZE)
+_queue_handler = QueueLogHandler(_log_writer)
+_rate_limiter = RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_BURST)
+_queue_handler.addFilter(_rate_limiter)
+
+@atexit.register
+def flush_logs():
+    """Write out queued records; runs at interpreter exit, before logging shuts down."""
+    _log_writer.stop(LOG_SHUTDOWN_TIMEOUT)
+
+def dropped_log_records() -> int:
+    """Records this process dropped because the log queue was full."""
+    return _log_writer.dropped
 
 def get_logger(name):
     """Get a configured logger instance"""
@@ -40,15 +264,20 @@ def get_logger(name):
         # Set log level
         logger.setLevel(getattr(logging, LOG_LEVEL))
         
-        # Create console handler
-        handler = logging.StreamHandler(sys.stdout)
-        
-        # Create formatter
-        formatter = CustomJsonFormatter('%(timestamp)s %(level)s %(name)s %(message)s')
-        handler.setFormatter(formatter)
-        
-        # Add handler to logger
-        logger.addHandler(handler)
+        if LOG_QUEUE_ENABLED:
+            # All loggers share the queue and its writer thread
+            logger.addHandler(_queue_handler)
+        else:
+            # Create console handler
+            handler = logging.StreamHandler(sys.stdout)
+            
+            # Create formatter
+            formatter = CustomJsonFormatter('%(timestamp)s %(level)s %(name)s %(message)s')
+            handler.setFormatter(formatter)
+            handler.addFilter(_rate_limiter)
+            
+            # Add handler to logger
+            logger.addHandler(handler)
     
     return logger
 
@@ -45,6 +45,10 @@ class Question(db.Model):
     
     responses = db.relationship('Response', backref='question', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_question_active_survey_type_order', 'active', 'survey_type', 'order'),
+    )
+
     @property
     def options(self):
         if self._options:
@@ -88,6 +92,11 @@ class Response(db.Model):
     answer = db.Column(db.String(500), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_response_chat_session_id', 'chat_session_id'),
+        db.Index('ix_response_eval_id', 'eval_id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -131,8 +140,12 @@ class ChatSession(db.Model):
     end_time = db.Column(db.DateTime)
     completed = db.Column(db.Boolean, default=False)
     # Add relationships
-    chat_messages = db.relationship('ChatMessage', backref='chat_session', lazy=True)
-    responses = db.relationship('Response', backref='chat_session', lazy=True)
+    chat_messages = db.relationship('ChatMessage', backref='chat_session', lazy=True, order_by='ChatMessage.id')
+    responses = db.relationship('Response', backref='chat_session', lazy=True, order_by='Response.id')
+
+    __table_args__ = (
+        db.Index('ix_chat_session_evaluation_id_completed', 'evaluation_id', 'completed'),
+    )
 
     def to_dict(self):
         return {
@@ -152,3 +165,74 @@ class ChatMessage(db.Model):
     sender = db.Column(db.String(10), nullable=False)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_chat_message_chat_session_id_id', 'chat_session_id', 'id'),
+    )
+
+class GenerationJob(db.Model):
+    """A queued bot reply, generated by the background worker pool."""
+    id = db.Column(db.String(36), primary_key=True)
+    chat_session_id = db.Column(db.Integer, db.ForeignKey('chat_session.id'), nullable=False)
+    user_message_id = db.Column(db.Integer, db.ForeignKey('chat_message.id'), nullable=False)
+    bot_message_id = db.Column(db.Integer, db.ForeignKey('chat_message.id'))
+    status = db.Column(db.String(10), nullable=False, default='queued', index=True)
+    reasoning = db.Column(db.Text)
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    bot_message = db.relationship('ChatMessage', foreign_keys=[bot_message_id])
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'chat_session_id': self.chat_session_id,
+            'status': self.status
+        }
+        if self.status == 'done' and self.bot_message:
+            data['message'] = {
+                'id': self.bot_message.id,
+                'content': self.bot_message.content,
+                'reasoning': self.reasoning,
+                'timestamp': self.bot_message.timestamp.isoformat()
+            }
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+class PreparedOpener(db.Model):
+    """A pre-generated opening bot message, waiting to be handed to a new chat session."""
+    id = db.Column(db.Integer, primary_key=True)
+    language_model = db.Column(db.String(36), nullable=False)
+    use_case = db.Column(db.String(36), nullable=False)
+    prompt_type = db.Column(db.String(36), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    reasoning = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_prepared_opener_cell', 'language_model', 'use_case', 'prompt_type', 'created_at'),
+    )
+
+class ResponseSummary(db.Model):
+    """Running totals of post-survey Likert answers per experiment cell and question."""
+    language_model = db.Column(db.String(36), primary_key=True)
+    prompt_type = db.Column(db.String(36), primary_key=True)
+    use_case = db.Column(db.String(36), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.BigInteger, nullable=False, default=0)
+    total_squares = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'language_model': self.language_model,
+            'prompt_type': self.prompt_type,
+            'use_case': self.use_case,
+            'question_id': self.question_id,
+            'n': self.n,
+            'mean': self.total / self.n if self.n else None,
+            'variance': (self.total_squares - self.total * self.total / self.n) / (self.n - 1) if self.n > 1 else None
+        }
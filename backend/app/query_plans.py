@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+
+from app import db
+from app.models import ChatMessage, ChatSession, Response, User
+from app.services.history_cache import history_delta_query
+from app.services.job_queue import queued_jobs, stale_jobs
+from app.services.openers import opener_pool
+from app.services.progress import completed_use_cases_query
+from app.services.question_catalog import catalog_version_query, survey_questions
+
+# Hot queries that may read a whole table, and the table; anything else must look rows up by index
+KNOWN_FULL_SCANS = {
+    # Runs at most every QUESTION_CACHE_TTL seconds per process, over a few dozen rows
+    'question catalog version': 'question',
+}
+
+def hot_queries() -> Dict[str, object]:
+    """
+    The lookups the API runs on every request, with placeholder values.
+
+    Built with the same query helpers the routes and services use, so a
+    change to one of them is checked here too. The /results statements are
+    the ones its selectinload options emit. Each query must be answerable
+    from an index, unless it is listed in KNOWN_FULL_SCANS.
+    """
+    session_ids = [1, 2, 3]
+    return {
+        'question catalog version': catalog_version_query(),
+        'questions of a survey': survey_questions('pre'),
+        'user by session id': User.query.filter_by(session_id='00000000-0000-0000-0000-000000000000'),
+        'completed use cases of an evaluation': completed_use_cases_query(1),
+        'next topic: newly completed use cases': completed_use_cases_query(1, frozenset({'education'})),
+        'results: sessions': ChatSession.query.filter(ChatSession.evaluation_id.in_([1])),
+        'results: responses': Response.query.filter(Response.chat_session_id.in_(session_ids)),
+        'results: messages': ChatMessage.query.filter(ChatMessage.chat_session_id.in_(session_ids))
+            .order_by(ChatMessage.id),
+        'chat history delta': history_delta_query(1, 0),
+        'generation job claim': queued_jobs(),
+        'stale generation jobs': stale_jobs(datetime(2000, 1, 1)),
+        'fresh openers of a cell': opener_pool.fresh('llama', 'education', 'standard').limit(3),
+    }
+
+def _explain(sql: str, allowed_table: str = None) -> Tuple[List[str], bool]:
+    """
+    Return the plan lines of a statement and whether it avoids full scans.
+
+    Only index lookups pass: SQLite SEARCH steps, and PostgreSQL index scans
+    with an index condition. A walk over a whole table or index (SQLite
+    "SCAN t", also "SCAN t USING [COVERING] INDEX i"; PostgreSQL "Seq Scan",
+    or an index scan without "Index Cond") fails, unless it reads
+    allowed_table.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+        lines = [row[-1] for row in rows]
+        scanned = [line.split()[1] for line in lines
+                   if line.startswith('SCAN ') and not line.startswith('SCAN CONSTANT ROW')]
+        return lines, all(table == allowed_table for table in scanned)
+    if dialect == 'postgresql':
+        # Small tables are cheaper to scan, so forbid it to see whether an index can be used at all
+        db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        lines = [row[0] for row in db.session.execute(text(f'EXPLAIN {sql}')).fetchall()]
+        # Plan nodes, each with the detail lines (conditions, filters) printed under it
+        nodes: List[List[str]] = []
+        for line in lines:
+            if not nodes or '->' in line:
+                nodes.append([line])
+            else:
+                nodes[-1].append(line)
+        ok = True
+        for node in nodes:
+            head = node[0].split('->')[-1].strip()
+            if head.startswith('Seq Scan on '):
+                ok &= head.split()[3] == allowed_table
+            elif head.startswith(('Index Scan', 'Index Only Scan')) and not any('Index Cond:' in line for line in node):
+                ok &= head.split(' on ')[-1].split()[0] == allowed_table
+        return lines, ok
+    raise NotImplementedError(f"Query plan checks are not supported on {dialect}")
+
+def check_query_plans() -> List[Tuple[str, List[str], bool]]:
+    """
+    EXPLAIN every hot query against the current database.
+
+    Returns:
+        A list of (name, plan lines, uses an index) tuples.
+    """
+    results = []
+    try:
+        for name, query in hot_queries().items():
+            statement = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+            lines, ok = _explain(str(statement), KNOWN_FULL_SCANS.get(name))
+            results.append((name, lines, ok))
+    finally:
+        db.session.rollback()
+    return results
@@ -0,0 +1,147 @@
+import time
+from typing import Optional
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.logging_config import get_logger
+from app.services.metrics import db_errors, db_query_duration, sql_operation
+
+logger = get_logger(__name__)
+
+# Longest SQL statement text written to the slow statement log
+_MAX_STATEMENT_LENGTH = 2000
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more SQL statements than its route's declared query budget."""
+
+class RequestQueries:
+    """The SQL statements one request has run so far and their total time."""
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+def query_budget(statements: int):
+    """
+    Route decorator: declare the most SQL statements one request of the view may run.
+
+    Going over the budget fails the request in testing (or with
+    QUERY_BUDGET_ENFORCE) and is logged as a warning otherwise, so N+1
+    queries show up as soon as they are introduced.
+
+    Args:
+        statements: The budget, counting every statement the request thread runs.
+    """
+    def decorate(view):
+        view.query_budget = statements
+        return view
+    return decorate
+
+def _redact(parameters, executemany: bool):
+    """Describe statement parameters by type only, so no participant data reaches the logs."""
+    if executemany:
+        return f"{len(parameters)} parameter sets"
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+class QueryStats:
+    """
+    Times every SQL statement with engine events.
+
+    Statements run by a request thread are counted and timed per request,
+    for the completion log, the X-DB-Statements and X-DB-Time-Ms response
+    headers and the query budgets of query_budget routes. Statements of
+    other threads, such as the message writer's group commits, are not
+    charged to any request. Every statement slower than slow_query_ms is
+    logged with its parameters redacted, and all of them feed the
+    db_query_duration_seconds metric.
+    """
+
+    def __init__(self, app=None):
+        self.slow_query_ms = 500.0
+        self.enforce = False
+        self.headers = True
+        self._instrumented = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        self.enforce = app.config.get('QUERY_BUDGET_ENFORCE', False) or app.testing
+        self.headers = app.config.get('QUERY_STATS_HEADERS', self.headers)
+        if not self._instrumented:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            self._instrumented = True
+        app.extensions['query_stats'] = self
+
+    def current(self) -> Optional[RequestQueries]:
+        """The statistics of the current request, or None outside a request."""
+        return g.get('query_stats') if has_request_context() else None
+
+    def start_request(self):
+        g.query_stats = RequestQueries()
+
+    def finish_request(self, response) -> RequestQueries:
+        """
+        Add the request's statistics to the response headers and check its query budget.
+
+        Raises:
+            QueryBudgetExceeded: If the route's budget is exceeded and budgets are enforced.
+        """
+        stats = self.current() or RequestQueries()
+        if self.headers:
+            response.headers['X-DB-Statements'] = str(stats.count)
+            response.headers['X-DB-Time-Ms'] = f"{stats.seconds * 1000:.2f}"
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and stats.count > budget:
+            message = f"{request.method} {request.path} ran {stats.count} SQL statements, over its budget of {budget}"
+            if self.enforce:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'db_statements': stats.count, 'query_budget': budget})
+        return stats
+
+query_stats = QueryStats()
+
+def _record(conn, statement: str, failed: bool = False) -> Optional[float]:
+    starts = conn.info.get('query_stats_start') if conn is not None else None
+    if not starts:
+        return None
+    elapsed = time.perf_counter() - starts.pop()
+    stats = query_stats.current()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if failed:
+        db_errors.inc(operation=sql_operation(statement))
+    else:
+        db_query_duration.observe(elapsed, operation=sql_operation(statement))
+    return elapsed
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_stats_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = _record(conn, statement)
+    if elapsed is not None and elapsed * 1000 >= query_stats.slow_query_ms:
+        # The statement is part of the message, so the log rate limit only collapses repeats of the same one
+        logger.warning(
+            f"Slow SQL statement: {' '.join(statement.split())[:200]}",
+            extra={
+                'statement': statement[:_MAX_STATEMENT_LENGTH],
+                'parameters': _redact(parameters, executemany),
+                'duration_ms': round(elapsed * 1000, 2)
+            }
+        )
+
+def _handle_error(context):
+    _record(context.connection, context.statement or '', failed=True)
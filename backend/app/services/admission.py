@@ -0,0 +1,180 @@
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+from app.models import LanguageModel
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+class AdmissionRejected(Exception):
+    """The model is saturated and its wait queue is full or the wait timed out."""
+
+    def __init__(self, language_model: LanguageModel, retry_after: int):
+        super().__init__(f"Too many requests for {language_model.value}, please retry in {retry_after} seconds")
+        self.language_model = language_model
+        self.retry_after = retry_after
+
+class _FileSlots:
+    """
+    A non-blocking counting semaphore shared by every process on the host.
+
+    Each slot is a lock file held with flock; the kernel releases it when the
+    holder closes the file or dies, so a crashed worker never leaks a slot.
+    """
+
+    def __init__(self, directory: str, name: str, size: int):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f"{name}-{i}.lock") for i in range(size)]
+
+    def try_acquire(self) -> Optional[int]:
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def release(self, token: int):
+        os.close(token)
+
+class _ThreadSlots:
+    """In-process fallback for platforms without fcntl; limits apply per process."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[bool]:
+        with self._lock:
+            if self.used >= self.size:
+                return None
+            self.used += 1
+            return True
+
+    def release(self, token):
+        with self._lock:
+            self.used -= 1
+
+class AdmissionSlot:
+    """A reserved call slot; release it, or use it as a context manager."""
+
+    def __init__(self, slots, token):
+        self._slots = slots
+        self._token = token
+
+    def release(self):
+        if self._token is not None:
+            self._slots.release(self._token)
+            self._token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class AdmissionController:
+    """
+    Limits concurrent LLM calls per language model.
+
+    Up to limit calls run at once; up to queue_size more wait for a free slot
+    for at most max_wait seconds. Anything beyond that is rejected right away
+    so the client can back off (HTTP 429 with Retry-After) instead of every
+    request slowing down together. Slots are lock files in lock_dir, shared by
+    all gunicorn workers on the host. A waiting request holds a server thread,
+    so queue_size should stay below the threads left over by limit, and a
+    queue_size of 0 rejects every call that finds the model saturated.
+    """
+
+    def __init__(self, app=None):
+        self.limits: Dict[str, int] = {}
+        self.default_limit = 4
+        self.queue_size = 2
+        self.max_wait = 3.0
+        self.retry_after = 5
+        self.lock_dir = os.path.join(tempfile.gettempdir(), 'chatbot-eval-admission')
+        self._running: Dict[LanguageModel, object] = {}
+        self._waiting: Dict[LanguageModel, object] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.limits = dict(app.config.get('ADMISSION_LIMITS', {}))
+        self.default_limit = app.config.get('ADMISSION_DEFAULT_LIMIT', self.default_limit)
+        self.queue_size = app.config.get('ADMISSION_QUEUE_SIZE', self.queue_size)
+        self.max_wait = app.config.get('ADMISSION_MAX_WAIT', self.max_wait)
+        self.retry_after = app.config.get('ADMISSION_RETRY_AFTER', self.retry_after)
+        self.lock_dir = app.config.get('ADMISSION_LOCK_DIR') or self.lock_dir
+        self._running = {}
+        self._waiting = {}
+        for model in LanguageModel:
+            limit = self.limits.get(model.value, self.default_limit)
+            if fcntl is not None:
+                self._running[model] = _FileSlots(self.lock_dir, f"{model.value}-running", limit)
+                self._waiting[model] = _FileSlots(self.lock_dir, f"{model.value}-waiting", self.queue_size)
+            else:
+                self._running[model] = _ThreadSlots(limit)
+                self._waiting[model] = _ThreadSlots(self.queue_size)
+        app.extensions['admission_control'] = self
+
+    def acquire(self, language_model: LanguageModel, queued: bool = True) -> AdmissionSlot:
+        """
+        Reserve a call slot for a model.
+
+        Args:
+            language_model: The model about to be called.
+            queued: If False, wait for a slot without a deadline and without
+                taking a queue place; for background workers whose own
+                concurrency is already bounded.
+
+        Returns:
+            The reserved AdmissionSlot.
+
+        Raises:
+            AdmissionRejected: If the wait queue is full or max_wait passed.
+        """
+        running = self._running[language_model]
+        token = running.try_acquire()
+        if token is not None:
+            return AdmissionSlot(running, token)
+
+        waiting = self._waiting[language_model]
+        place = waiting.try_acquire() if queued else None
+        if queued and place is None:
+            logger.warning("Admission queue full", extra={'language_model': language_model.value})
+            raise AdmissionRejected(language_model, self.retry_after)
+
+        try:
+            deadline = time.monotonic() + self.max_wait if queued else None
+            delay = 0.02
+            while deadline is None or time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.25)
+                token = running.try_acquire()
+                if token is not None:
+                    return AdmissionSlot(running, token)
+        finally:
+            if place is not None:
+                waiting.release(place)
+
+        logger.warning("Admission wait timed out", extra={'language_model': language_model.value})
+        raise AdmissionRejected(language_model, self.retry_after)
+
+    def try_acquire(self, language_model: LanguageModel) -> Optional[AdmissionSlot]:
+        """Reserve a call slot only if one is free right now, for optional background work."""
+        running = self._running[language_model]
+        token = running.try_acquire()
+        return AdmissionSlot(running, token) if token is not None else None
+
+admission_control = AdmissionController()
@@ -0,0 +1,234 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, select
+
+from app import db
+from app.models import ChatSession, PromptType, Question, QuestionType, Response, ResponseSummary
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Columns post-survey answers can be grouped by
+GROUP_COLUMNS = {
+    'language_model': ChatSession.language_model,
+    'prompt_type': ChatSession.prompt_type,
+    'use_case': ChatSession.use_case,
+}
+
+# Comparisons contrast every other prompt type with this one
+BASELINE_PROMPT_TYPE = PromptType.STANDARD.value
+
+# Resampled values per vectorized block, to bound memory for large cells
+_BLOCK_ELEMENTS = 1_000_000
+
+def bootstrap_mean_difference(baseline: np.ndarray, treatment: np.ndarray, samples: int,
+                              confidence: float, seed: int) -> Tuple[float, float]:
+    """
+    Percentile bootstrap confidence interval of mean(treatment) - mean(baseline).
+
+    Runs in the analytics process pool, so it only uses NumPy.
+
+    Returns:
+        The (low, high) bounds of the interval.
+    """
+    rng = np.random.default_rng(seed)
+    block = max(1, _BLOCK_ELEMENTS // max(len(baseline), len(treatment)))
+    differences = np.empty(samples)
+    for start in range(0, samples, block):
+        size = min(block, samples - start)
+        baseline_means = baseline[rng.integers(0, len(baseline), (size, len(baseline)))].mean(axis=1)
+        treatment_means = treatment[rng.integers(0, len(treatment), (size, len(treatment)))].mean(axis=1)
+        differences[start:start + size] = treatment_means - baseline_means
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(differences, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+def _bootstrap_task(args):
+    return bootstrap_mean_difference(*args)
+
+class AnalyticsService:
+    """
+    Likert statistics of the post-survey per experiment cell.
+
+    Counts, means and variances are summed from the ResponseSummary table
+    and answer distributions are counted by the database with GROUP BY.
+    Comparisons of each prompt type with the standard one (mean difference,
+    Cohen's d and a bootstrap confidence interval) are computed with NumPy
+    from the same per-value counts, expanded with np.repeat;
+    the bootstraps run in a process pool of `workers` processes (0 runs them
+    inline). Results are cached per process until the response or summary
+    table changes.
+    """
+
+    def __init__(self, app=None):
+        self.workers = 2
+        self.bootstrap_samples = 2000
+        self.confidence = 0.95
+        self.cache_size = 32
+        self._cache: OrderedDict = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get('ANALYTICS_WORKERS', self.workers)
+        self.bootstrap_samples = app.config.get('ANALYTICS_BOOTSTRAP_SAMPLES', self.bootstrap_samples)
+        self.confidence = app.config.get('ANALYTICS_CONFIDENCE', self.confidence)
+        self._cache = OrderedDict()
+        app.extensions['analytics'] = self
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                # forkserver children don't inherit the web worker's threads and sockets
+                context = multiprocessing.get_context(
+                    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                )
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._executor_pid = os.getpid()
+                atexit.register(self._executor.shutdown, cancel_futures=True)
+            return self._executor
+
+    def _version(self) -> Tuple:
+        """
+        Changes whenever responses are added, or the summary table changes.
+
+        The highest response id comes from the primary key index and the
+        sums from the small summary table, so no table of responses is
+        counted. Returns (highest response id, summarized Likert answers,
+        their total, their total of squares).
+        """
+        summary_totals = [select(func.sum(column)).scalar_subquery()
+                          for column in (ResponseSummary.n, ResponseSummary.total, ResponseSummary.total_squares)]
+        return tuple(db.session.query(func.max(Response.id), *summary_totals).one())
+
+    def summary(self, group_by: Sequence[str], bootstrap_samples: Optional[int] = None) -> Dict:
+        """
+        Per-cell Likert statistics and prompt type comparisons.
+
+        Args:
+            group_by: Keys of GROUP_COLUMNS defining a cell, e.g. all three
+                for (model, prompt type, use case).
+            bootstrap_samples: Bootstrap resamples per comparison; 0 skips
+                the confidence intervals. Defaults to the configured value.
+
+        Returns:
+            A dictionary with the number of summarized Likert answers
+            ('responses') and 'cells' and 'comparisons' lists.
+        """
+        samples = self.bootstrap_samples if bootstrap_samples is None else bootstrap_samples
+        key = (self._version(), tuple(group_by), samples, self.confidence)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        result = {
+            'group_by': list(group_by),
+            'responses': int(key[0][1] or 0),
+            'cells': self._cells(group_by),
+            'comparisons': self._comparisons(group_by, samples),
+        }
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _likert_query(self, *columns):
+        return db.session.query(*columns) \
+            .join(ChatSession, Response.chat_session_id == ChatSession.id) \
+            .join(Question, Response.question_id == Question.id) \
+            .filter(Question.type == QuestionType.LIKERT.value)
+
+    def _cells(self, group_by: Sequence[str]) -> List[Dict]:
+        keys = [GROUP_COLUMNS[name] for name in group_by] + [Response.question_id]
+        value = cast(Response.answer, Integer)
+
+        # Moments come from the incrementally maintained summary table, which is much smaller
+        summary_keys = [getattr(ResponseSummary, name) for name in group_by] + [ResponseSummary.question_id]
+        totals = db.session.query(
+            *summary_keys,
+            func.sum(ResponseSummary.n), func.sum(ResponseSummary.total), func.sum(ResponseSummary.total_squares)
+        ).group_by(*summary_keys).all()
+        distributions = defaultdict(dict)
+        for *cell, answer, count in self._likert_query(*keys, value, func.count(Response.id)) \
+                .group_by(*keys, value).all():
+            distributions[tuple(cell)][str(answer)] = count
+
+        cells = []
+        for *cell, n, total, squares in totals:
+            n, total, squares = int(n), int(total), int(squares)
+            mean = total / n
+            variance = (squares - total * total / n) / (n - 1) if n > 1 else None
+            cells.append({
+                **dict(zip(list(group_by) + ['question_id'], cell)),
+                'n': n,
+                'mean': mean,
+                'variance': variance,
+                'distribution': distributions[tuple(cell)]
+            })
+        return cells
+
+    def _comparisons(self, group_by: Sequence[str], samples: int) -> List[Dict]:
+        others = [name for name in group_by if name != 'prompt_type']
+        keys = [GROUP_COLUMNS[name] for name in others] + [Response.question_id, ChatSession.prompt_type]
+        value = cast(Response.answer, Integer)
+
+        # The database counts each answer value, the answers themselves are never loaded
+        counts = defaultdict(lambda: ([], []))
+        for *group, prompt_type, answer, count in self._likert_query(*keys, value, func.count(Response.id)) \
+                .group_by(*keys, value).order_by(*keys, value).all():
+            answers, repeats = counts[(tuple(group), prompt_type)]
+            answers.append(answer)
+            repeats.append(count)
+        values = {key: np.repeat(np.asarray(answers, dtype=float), repeats)
+                  for key, (answers, repeats) in counts.items()}
+
+        comparisons, tasks = [], []
+        for (group, prompt_type), treatment in sorted(values.items(), key=lambda item: item[0]):
+            baseline = values.get((group, BASELINE_PROMPT_TYPE))
+            if prompt_type == BASELINE_PROMPT_TYPE or baseline is None:
+                continue
+            difference = treatment.mean() - baseline.mean()
+            comparison = {
+                **dict(zip(others + ['question_id'], group)),
+                'baseline': BASELINE_PROMPT_TYPE,
+                'prompt_type': prompt_type,
+                'n_baseline': len(baseline),
+                'n': len(treatment),
+                'mean_difference': float(difference),
+                'cohens_d': None,
+                'ci_low': None,
+                'ci_high': None
+            }
+            if len(baseline) > 1 and len(treatment) > 1:
+                pooled = np.sqrt(((len(baseline) - 1) * baseline.var(ddof=1) + (len(treatment) - 1) * treatment.var(ddof=1))
+                                 / (len(baseline) + len(treatment) - 2))
+                comparison['cohens_d'] = float(difference / pooled) if pooled > 0 else None
+                if samples > 0:
+                    # Seeded by the comparison, so cached and recomputed results agree
+                    seed = zlib.crc32(repr((group, prompt_type)).encode('utf-8'))
+                    tasks.append((comparison, (baseline, treatment, samples, self.confidence, seed)))
+            comparisons.append(comparison)
+
+        if tasks:
+            if self.workers > 0 and len(tasks) > 1:
+                intervals = self._pool().map(_bootstrap_task, [args for _, args in tasks])
+            else:
+                intervals = map(_bootstrap_task, [args for _, args in tasks])
+            for (comparison, _), (low, high) in zip(tasks, intervals):
+                comparison['ci_low'], comparison['ci_high'] = low, high
+        return comparisons
+
+analytics = AnalyticsService()
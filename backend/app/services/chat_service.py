@@ -1,19 +1,101 @@
-import requests
-from typing import List, Dict, Any
+import asyncio
+import time
+import httpx
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
 from datetime import datetime
 import json
 from app.models import LanguageModel, UseCase, PromptType
 from app.services.system_prompts import get_system_prompt
+from app.services.http_client import llm_client
+from app.services.replica_pool import NoReplicaAvailable, ReplicaCall, replica_router
+from app.services.context_window import context_window
+from app.services.response_cache import response_cache
+from app.services.metrics import llm_outcome, llm_request_duration
+from app.services.tracing import SPAN_KIND_CLIENT, tracer
 from app.logging_config import get_logger, log_exception
 
 logger = get_logger(__name__)
 
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+class ReasoningSplitter:
+    """
+    Incrementally separates <think>...</think> reasoning from the visible reply.
+    
+    Tags may be split across streamed chunks, so a possible partial tag at the
+    end of a chunk is held back until the next chunk resolves it.
+    """
+    
+    def __init__(self):
+        self.in_reasoning = False
+        self.reasoning = ""
+        self.content = ""
+        self._pending = ""
+    
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """Length of the longest suffix of text that is a proper prefix of tag."""
+        for length in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:length]):
+                return length
+        return 0
+    
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        Consume a streamed chunk.
+        
+        Args:
+            chunk: The next piece of model output.
+        
+        Returns:
+            A list of (kind, delta) tuples where kind is "reasoning" or "content".
+        """
+        text = self._pending + chunk
+        self._pending = ""
+        deltas = []
+        
+        while text:
+            tag = THINK_CLOSE if self.in_reasoning else THINK_OPEN
+            index = text.find(tag)
+            if index != -1:
+                self._emit(text[:index], deltas)
+                self.in_reasoning = not self.in_reasoning
+                text = text[index + len(tag):]
+                continue
+            
+            partial = self._partial_tag_length(text, tag)
+            if partial:
+                self._pending = text[-partial:]
+                text = text[:-partial]
+            self._emit(text, deltas)
+            break
+        
+        return deltas
+    
+    def flush(self) -> List[Tuple[str, str]]:
+        """Emit any held-back text once the stream has ended."""
+        deltas = []
+        self._emit(self._pending, deltas)
+        self._pending = ""
+        return deltas
+    
+    def _emit(self, text: str, deltas: List[Tuple[str, str]]):
+        if not text:
+            return
+        if self.in_reasoning:
+            self.reasoning += text
+            deltas.append(("reasoning", text))
+        else:
+            self.content += text
+            deltas.append(("content", text))
+    
+    def result(self) -> Tuple[str, Optional[str]]:
+        """Return the stripped (content, reasoning) pair collected so far."""
+        reasoning = self.reasoning.strip() or None
+        return self.content.strip(), reasoning
+
 class ChatService:
-    API_ENDPOINTS = {
-        LanguageModel.LLAMA: "http://137.250.171.154:11434/api/chat",
-        #LanguageModel.GPT4O: "http://137.250.171.154:5050/api/chat", # wait for openai key
-        LanguageModel.R1: "http://137.250.171.154:11434/api/chat"
-    }
     
     def __init__(self, language_model: LanguageModel, use_case: UseCase, prompt_type: PromptType):
         """
@@ -27,12 +109,15 @@ class ChatService:
         self.language_model = language_model
         self.use_case = use_case
         self.prompt_type = prompt_type
-        self.api_url = self.API_ENDPOINTS[language_model]
+        self.context_report = None
     
     def format_messages(self, chat_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """
         Format the chat history by prepending the system prompt to the messages.
         
+        The history is fitted into the model's token budget by the context window
+        manager; how much was trimmed is kept in self.context_report.
+        
         Args:
             chat_history: A list of dictionaries representing the chat history.
         
@@ -40,24 +125,32 @@ class ChatService:
             A list of dictionaries with the system prompt as the first message.
         """
         system_prompt = get_system_prompt(self.use_case, self.prompt_type, self.language_model)
-        return [
-            {"role": "system", "content": system_prompt},
-            *chat_history
-        ]
+        messages, self.context_report = context_window.fit(self.language_model, system_prompt, chat_history)
+        
+        if self.context_report.trimmed:
+            logger.info(
+                "Trimmed chat history to fit the context budget",
+                extra={
+                    'language_model': self.language_model.value,
+                    **self.context_report.to_dict()
+                }
+            )
+        return messages
     
-    def create_payload(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    def create_payload(self, messages: List[Dict[str, str]], stream: bool = False) -> Dict[str, Any]:
         """
         Create the payload for the API request based on the messages and model-specific configurations.
         
         Args:
             messages: A list of dictionaries representing the formatted chat messages.
+            stream: Whether the backend should stream the reply as NDJSON chunks.
         
         Returns:
             A dictionary containing the payload for the API request.
         """
         base_config = {
             "messages": messages,
-            "stream": False,
+            "stream": stream,
             "resp_format": "json",
             "options": {
                 "temperature": 0.5, 
@@ -86,6 +179,115 @@ class ChatService:
 
         return base_config
     
+    @staticmethod
+    def split_reasoning(text: str) -> Tuple[str, Optional[str]]:
+        """
+        Split a complete model reply into visible content and reasoning.
+        
+        Args:
+            text: The full reply, possibly containing a <think>...</think> block.
+        
+        Returns:
+            A tuple of (content, reasoning), where reasoning is None if absent.
+        """
+        if THINK_OPEN not in text or THINK_CLOSE not in text:
+            return text, None
+        splitter = ReasoningSplitter()
+        splitter.feed(text)
+        splitter.flush()
+        return splitter.result()
+    
+    async def _post(self, replica: ReplicaCall, payload: Dict[str, Any], headers: Dict[str, str]) -> httpx.Response:
+        """
+        Send one non-streaming request to a replica and record the outcome.
+        
+        Transport errors, timeouts and 5xx responses count against the replica's
+        circuit breaker; the latency of successful calls feeds the hedging delay.
+        """
+        started = time.monotonic()
+        try:
+            response = await llm_client.client_for(replica.url).post(
+                replica.url,
+                json=payload,
+                headers=headers
+            )
+        except httpx.TransportError:
+            replica_router.mark_failed(replica)
+            raise
+        
+        if response.status_code >= 500:
+            replica_router.mark_failed(replica)
+        else:
+            replica_router.mark_succeeded(replica)
+            replica_router.record_latency(self.language_model, time.monotonic() - started)
+        return response
+    
+    def _start(self, replica: ReplicaCall, payload: Dict[str, Any], headers: Dict[str, str]) -> asyncio.Task:
+        task = asyncio.ensure_future(self._post(replica, payload, headers))
+        task.add_done_callback(lambda _: replica_router.release(replica))
+        return task
+    
+    async def _send(self, payload: Dict[str, Any], headers: Dict[str, str]) -> httpx.Response:
+        """
+        Send the request to the least-loaded replica.
+        
+        With hedging enabled, a duplicate goes to a second replica once the first
+        call runs past the model's latency percentile; the first successful reply
+        wins and the other call is cancelled.
+        
+        Raises:
+            NoReplicaAvailable: If every replica's circuit breaker is open.
+        """
+        primary = replica_router.reserve(self.language_model)
+        first = self._start(primary, payload, headers)
+        
+        delay = replica_router.hedge_delay(self.language_model)
+        if delay is None:
+            return await first
+        
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        
+        try:
+            backup = replica_router.reserve(self.language_model, exclude=[primary.replica])
+        except NoReplicaAvailable:
+            return await first
+        
+        logger.info(
+            "Hedging slow LLM call",
+            extra={'language_model': self.language_model.value, 'primary': primary.url, 'backup': backup.url, 'delay_s': round(delay, 2)}
+        )
+        pending = {first, self._start(backup, payload, headers)}
+        try:
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _cached_reply(self, payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Look the request up in the replay cache, if it is enabled.
+        
+        Returns:
+            A tuple of (cache key, cached reply); both are None when the cache is off.
+        """
+        if not response_cache.enabled:
+            return None, None
+        key = response_cache.make_key(self.use_case.value, self.prompt_type.value, payload)
+        return key, await asyncio.to_thread(response_cache.get, key)
+    
+    async def _cache_reply(self, key: Optional[str], content: str, reasoning: Optional[str]):
+        if key is not None:
+            await asyncio.to_thread(response_cache.put, key, {"content": content, "reasoning": reasoning})
+    
     async def process_chat(self, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
         """
         Process the chat by sending the formatted messages to the API and handling the response.
@@ -96,34 +298,41 @@ class ChatService:
         Returns:
             A dictionary containing the success status, content, reasoning (if any), and timestamp.
         """
+        started = time.perf_counter()
+        result = await self._process_chat(chat_history)
+        llm_request_duration.observe(time.perf_counter() - started, language_model=self.language_model.value,
+                                     mode='chat', outcome=llm_outcome(result))
+        return result
+    
+    async def _process_chat(self, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
         try:
             messages = self.format_messages(chat_history)
             payload = self.create_payload(messages)
             headers = {"Content-Type": "application/json"}
             
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                headers=headers,
-                timeout=100
-            )
+            cache_key, cached = await self._cached_reply(payload)
+            if cached:
+                return {
+                    "success": True,
+                    "content": cached["content"],
+                    "reasoning": cached["reasoning"],
+                    "context": self.context_report.to_dict(),
+                    "cached": True,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            
+            response = await self._send(payload, headers)
             
             if response.status_code == 200:
                 data = response.json()
-                content = data["message"]["content"]
-                reasoning = None
-                
-                # Extract reasoning content if present
-                if "<think>" in content and "</think>" in content:
-                    parts = content.split("</think>", 1)
-                    reasoning_with_tag = parts[0]
-                    reasoning = reasoning_with_tag.split("<think>", 1)[1].strip()
-                    content = parts[1].strip()
+                content, reasoning = self.split_reasoning(data["message"]["content"])
+                await self._cache_reply(cache_key, content, reasoning)
                 
                 return {
                     "success": True,
                     "content": content,
                     "reasoning": reasoning,
+                    "context": self.context_report.to_dict(),
                     "timestamp": datetime.utcnow().isoformat()
                 }
             
@@ -133,13 +342,21 @@ class ChatService:
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-        except requests.Timeout as e:
+        except httpx.TimeoutException as e:
             log_exception(logger, e, {'chat_history': chat_history})
             return {
                 "success": False,
                 "error": "Request timed out",
                 "timestamp": datetime.utcnow().isoformat()
             }
+        except NoReplicaAvailable as e:
+            logger.warning(str(e), extra={'language_model': self.language_model.value})
+            return {
+                "success": False,
+                "error": str(e),
+                "unavailable": True,
+                "timestamp": datetime.utcnow().isoformat()
+            }
         except Exception as e:
             log_exception(logger, e, {'chat_history': chat_history})
             return {
@@ -147,3 +364,190 @@ class ChatService:
                 "error": str(e),
                 "timestamp": datetime.utcnow().isoformat()
             }
+    
+    def process_chat_sync(self, chat_history: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Run process_chat on the shared client loop from synchronous code.
+        
+        Args:
+            chat_history: A list of dictionaries representing the chat history.
+        
+        Returns:
+            The result dictionary of process_chat.
+        """
+        # Traced here, as the coroutine runs on the client loop outside the request's context
+        with tracer.span('ChatService.process_chat', SPAN_KIND_CLIENT, **{
+            'llm.model': self.language_model.value, 'llm.messages': len(chat_history)
+        }) as span:
+            result = llm_client.run(self.process_chat(chat_history))
+            if span is not None:
+                span.set_attribute('llm.outcome', llm_outcome(result))
+            return result
+    
+    def stream_chat(self, chat_history: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Consume astream_chat from synchronous code, e.g. a Flask streaming response.
+        
+        Args:
+            chat_history: A list of dictionaries representing the chat history.
+        
+        Returns:
+            An iterator over the events produced by astream_chat.
+        """
+        events = llm_client.iterate(self.astream_chat(chat_history))
+        span = tracer.start_span('ChatService.stream_chat', SPAN_KIND_CLIENT, **{
+            'llm.model': self.language_model.value, 'llm.messages': len(chat_history)
+        })
+        return events if span is None else self._traced_stream(events, span)
+    
+    @staticmethod
+    def _traced_stream(events: Iterator[Dict[str, Any]], span) -> Iterator[Dict[str, Any]]:
+        error = None
+        try:
+            for event in events:
+                if event["type"] == "content" and "llm.first_token_ms" not in span.attributes:
+                    span.set_attribute("llm.first_token_ms", round((time.time_ns() - span.start) / 1e6, 1))
+                elif event["type"] in ("done", "error"):
+                    span.set_attribute("llm.outcome", llm_outcome(event))
+                yield event
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            tracer.end_span(span, error)
+    
+    async def _relay_stream(self, replica: ReplicaCall, payload: Dict[str, Any], headers: Dict[str, str],
+                            splitter: ReasoningSplitter) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Relay one streamed reply from a replica through the reasoning splitter.
+        
+        Yields reasoning/content delta events, or a single error event if the
+        backend rejects the request or reports an error mid-stream.
+        """
+        client = llm_client.client_for(replica.url)
+        try:
+            async with client.stream(
+                "POST",
+                replica.url,
+                json=payload,
+                headers=headers
+            ) as response:
+                if response.status_code != 200:
+                    if response.status_code >= 500:
+                        replica_router.mark_failed(replica)
+                    yield {
+                        "type": "error",
+                        "error": f"Server error: {response.status_code}",
+                        "timestamp": datetime.utcnow().isoformat()
+                    }
+                    return
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        yield {
+                            "type": "error",
+                            "error": chunk["error"],
+                            "timestamp": datetime.utcnow().isoformat()
+                        }
+                        return
+                    
+                    delta = chunk.get("message", {}).get("content", "")
+                    for kind, text in splitter.feed(delta):
+                        yield {"type": kind, "delta": text}
+                    if chunk.get("done"):
+                        break
+        except httpx.TransportError:
+            replica_router.mark_failed(replica)
+            raise
+        replica_router.mark_succeeded(replica)
+    
+    async def astream_chat(self, chat_history: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the reply for the chat history as it is generated.
+        
+        Args:
+            chat_history: A list of dictionaries representing the chat history.
+        
+        Yields:
+            Event dictionaries: {"type": "reasoning" | "content", "delta": str} while
+            the model generates, then a single terminal {"type": "done", "content",
+            "reasoning", "context", "timestamp"} or {"type": "error", "error", "timestamp"} event.
+        """
+        started = time.perf_counter()
+        events = self._astream_chat(chat_history)
+        try:
+            async for event in events:
+                if event["type"] in ("done", "error"):
+                    llm_request_duration.observe(time.perf_counter() - started, language_model=self.language_model.value,
+                                                 mode='stream', outcome=llm_outcome(event))
+                yield event
+        finally:
+            # Release the replica at once if the client goes away mid-stream
+            await events.aclose()
+
+    async def _astream_chat(self, chat_history: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+        splitter = ReasoningSplitter()
+        try:
+            messages = self.format_messages(chat_history)
+            payload = self.create_payload(messages, stream=True)
+            headers = {"Content-Type": "application/json"}
+            
+            cache_key, cached = await self._cached_reply(payload)
+            if cached:
+                if cached["reasoning"]:
+                    yield {"type": "reasoning", "delta": cached["reasoning"]}
+                yield {"type": "content", "delta": cached["content"]}
+                yield {
+                    "type": "done",
+                    "content": cached["content"],
+                    "reasoning": cached["reasoning"],
+                    "context": self.context_report.to_dict(),
+                    "cached": True,
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+                return
+            
+            async with replica_router.acquire(self.language_model) as replica:
+                async for event in self._relay_stream(replica, payload, headers, splitter):
+                    yield event
+                    if event["type"] == "error":
+                        return
+            
+            for kind, text in splitter.flush():
+                yield {"type": kind, "delta": text}
+            
+            content, reasoning = splitter.result()
+            await self._cache_reply(cache_key, content, reasoning)
+            yield {
+                "type": "done",
+                "content": content,
+                "reasoning": reasoning,
+                "context": self.context_report.to_dict(),
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        
+        except httpx.TimeoutException as e:
+            log_exception(logger, e, {'chat_history': chat_history})
+            yield {
+                "type": "error",
+                "error": "Request timed out",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        except NoReplicaAvailable as e:
+            logger.warning(str(e), extra={'language_model': self.language_model.value})
+            yield {
+                "type": "error",
+                "error": str(e),
+                "unavailable": True,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        except Exception as e:
+            log_exception(logger, e, {'chat_history': chat_history})
+            yield {
+                "type": "error",
+                "error": str(e),
+                "timestamp": datetime.utcnow().isoformat()
+            }
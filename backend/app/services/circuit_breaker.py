@@ -0,0 +1,84 @@
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    After failure_threshold consecutive failures the breaker opens and calls
+    fail fast. Once reset_timeout has passed it lets a single trial call
+    through (half-open); success closes it again, failure re-opens it. Only
+    the trial's own release or result clears the trial, so calls that were
+    already running when the breaker opened cannot let a second one through.
+
+    Not thread-safe: it is only used from the shared LLM client loop.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    @property
+    def available(self) -> bool:
+        """Whether a call may be sent right now."""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._trial_in_flight)
+
+    def acquire(self) -> bool:
+        """
+        Register a call that was let through.
+
+        Returns:
+            True if the call is the half-open trial; pass it back to release
+            and record_success/record_failure.
+        """
+        if self.state == HALF_OPEN:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release(self, trial: bool):
+        """Forget an unfinished call; if it was the trial, e.g. a cancelled hedge, another may be sent."""
+        if trial:
+            self._trial_in_flight = False
+
+    def record_success(self, trial: bool = False):
+        """
+        Count a successful call.
+
+        A successful trial closes the breaker; other calls, e.g. ones sent
+        before it opened, leave an open breaker to its trial.
+        """
+        self.consecutive_failures = 0
+        if trial:
+            self._trial_in_flight = False
+            self.opened_at = None
+
+    def record_failure(self, trial: bool = False) -> bool:
+        """
+        Count a failed call.
+
+        Returns:
+            True if this failure opened (or re-opened) the breaker.
+        """
+        self.consecutive_failures += 1
+        if trial:
+            self._trial_in_flight = False
+        if trial or (self.opened_at is None and self.consecutive_failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            return True
+        return False
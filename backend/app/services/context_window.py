@@ -0,0 +1,201 @@
+import math
+from typing import Callable, Dict, List, Optional
+
+from app.models import LanguageModel
+
+# Rough heuristic for Llama-style BPE vocabularies on English text
+CHARS_PER_TOKEN = 4
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(message: Dict[str, str]) -> int:
+    """Estimate the prompt tokens a single chat message costs."""
+    return MESSAGE_OVERHEAD_TOKENS + math.ceil(len(message.get('content', '')) / CHARS_PER_TOKEN)
+
+class ContextReport:
+    """How a chat history was fitted into the token budget."""
+
+    def __init__(self, budget: int, strategy: str):
+        self.budget = budget
+        self.strategy = strategy
+        self.original_tokens = 0
+        self.final_tokens = 0
+        self.dropped_messages = 0
+        self.summarized_messages = 0
+
+    @property
+    def trimmed(self) -> bool:
+        return self.dropped_messages > 0
+
+    @property
+    def trimmed_tokens(self) -> int:
+        return self.original_tokens - self.final_tokens
+
+    def to_dict(self):
+        return {
+            'budget': self.budget,
+            'strategy': self.strategy,
+            'original_tokens': self.original_tokens,
+            'final_tokens': self.final_tokens,
+            'trimmed_tokens': self.trimmed_tokens,
+            'dropped_messages': self.dropped_messages,
+            'summarized_messages': self.summarized_messages
+        }
+
+class ContextStrategy:
+    """Base class for strategies that fit a history into a token budget."""
+
+    name = 'base'
+
+    def fit(self, history: List[Dict[str, str]], budget: int, report: ContextReport) -> List[Dict[str, str]]:
+        """
+        Reduce the history so that it fits the budget.
+
+        Args:
+            history: The chat history without the system prompt, oldest first.
+            budget: Tokens available for the history.
+            report: Report to record dropped and summarized messages on.
+
+        Returns:
+            The messages to send in place of the history.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _recent_suffix(history: List[Dict[str, str]], budget: int) -> int:
+        """
+        Index where the longest suffix of history that fits the budget starts.
+
+        The latest message is always kept, even if it alone exceeds the budget.
+        """
+        start = len(history)
+        used = 0
+        for index in range(len(history) - 1, -1, -1):
+            cost = estimate_tokens(history[index])
+            if used + cost > budget and start < len(history):
+                break
+            used += cost
+            start = index
+        return start
+
+class DropOldestStrategy(ContextStrategy):
+    """Drop the oldest turns until the rest fits."""
+
+    name = 'drop_oldest'
+
+    def fit(self, history, budget, report):
+        start = self._recent_suffix(history, budget)
+        report.dropped_messages = start
+        return history[start:]
+
+def brief_summary(messages: List[Dict[str, str]], max_chars: int) -> str:
+    """
+    Summarize turns without a model call by keeping the opening of each one.
+
+    Args:
+        messages: The turns to summarize, oldest first.
+        max_chars: Upper bound for the length of the summary.
+
+    Returns:
+        A compact transcript of the turns.
+    """
+    speakers = {'user': 'User', 'assistant': 'Assistant'}
+    per_message = max(40, max_chars // max(len(messages), 1))
+    lines = []
+    for message in messages:
+        text = ' '.join(message.get('content', '').split())
+        if len(text) > per_message:
+            text = text[:per_message - 3].rstrip() + '...'
+        lines.append(f"{speakers.get(message.get('role'), message.get('role'))}: {text}")
+    return '\n'.join(lines)[:max_chars]
+
+class SummarizeOlderStrategy(ContextStrategy):
+    """
+    Replace the turns that do not fit with a short summary message.
+
+    The summary gets a fixed share of the budget; the remainder is filled with
+    the most recent turns verbatim.
+    """
+
+    name = 'summarize'
+
+    def __init__(self, summary_share: float = 0.25,
+                 summarizer: Callable[[List[Dict[str, str]], int], str] = brief_summary):
+        self.summary_share = summary_share
+        self.summarizer = summarizer
+
+    def fit(self, history, budget, report):
+        if sum(estimate_tokens(m) for m in history) <= budget:
+            return history
+
+        summary_budget = int(budget * self.summary_share)
+        start = self._recent_suffix(history, budget - summary_budget)
+        older = history[:start]
+        if not older:
+            return history
+
+        max_chars = max(0, (summary_budget - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN)
+        summary = {
+            'role': 'system',
+            'content': 'Summary of the earlier conversation:\n' + self.summarizer(older, max_chars)
+        }
+        report.dropped_messages = len(older)
+        report.summarized_messages = len(older)
+        return [summary, *history[start:]]
+
+STRATEGIES = {
+    DropOldestStrategy.name: DropOldestStrategy,
+    SummarizeOlderStrategy.name: SummarizeOlderStrategy
+}
+
+class ContextWindowManager:
+    """
+    Keeps the system prompt plus the most recent turns within a per-model token budget.
+    """
+
+    def __init__(self, app=None):
+        self.budgets: Dict[str, int] = {}
+        self.default_budget = 6000
+        self.strategy: ContextStrategy = DropOldestStrategy()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.budgets = dict(app.config.get('CONTEXT_TOKEN_BUDGETS', {}))
+        self.default_budget = app.config.get('CONTEXT_TOKEN_BUDGET_DEFAULT', self.default_budget)
+        strategy = app.config.get('CONTEXT_STRATEGY', DropOldestStrategy.name)
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context strategy: {strategy}")
+        self.strategy = STRATEGIES[strategy]()
+        app.extensions['context_window'] = self
+
+    def budget_for(self, language_model: LanguageModel) -> int:
+        return self.budgets.get(language_model.value, self.default_budget)
+
+    def fit(self, language_model: LanguageModel, system_prompt: str, history: List[Dict[str, str]],
+            strategy: Optional[ContextStrategy] = None):
+        """
+        Build the messages for a model call within the model's token budget.
+
+        Args:
+            language_model: The model the messages are sent to.
+            system_prompt: The system prompt, which is always kept.
+            history: The chat history, oldest first.
+            strategy: Overrides the configured strategy for this call.
+
+        Returns:
+            A tuple of (messages, ContextReport).
+        """
+        strategy = strategy or self.strategy
+        budget = self.budget_for(language_model)
+        report = ContextReport(budget, strategy.name)
+
+        system_message = {"role": "system", "content": system_prompt}
+        system_tokens = estimate_tokens(system_message)
+        report.original_tokens = system_tokens + sum(estimate_tokens(m) for m in history)
+
+        fitted = strategy.fit(history, max(budget - system_tokens, 0), report)
+        report.final_tokens = system_tokens + sum(estimate_tokens(m) for m in fitted)
+        return [system_message, *fitted], report
+
+context_window = ContextWindowManager()
@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+from sqlalchemy import or_, select
+
+from app import db
+from app.models import ChatMessage, ChatSession, Evaluation, Question, Response, User
+
+# Exported tables, parents first, with the columns that mark a row as new or changed since a timestamp
+EXPORT_TABLES = {
+    'users': (User, ['created_at']),
+    'questions': (Question, ['created_at', 'updated_at']),
+    'evaluations': (Evaluation, ['start_time', 'end_time']),
+    'chat_sessions': (ChatSession, ['start_time', 'end_time']),
+    'chat_messages': (ChatMessage, ['timestamp']),
+    'responses': (Response, ['created_at']),
+}
+
+FORMATS = ('ndjson', 'csv', 'parquet')
+
+def columns(table: str) -> List[str]:
+    """The exported column names of a table, in table order."""
+    model = EXPORT_TABLES[table][0]
+    return [column.name for column in model.__table__.columns]
+
+def iter_rows(table: str, since: Optional[datetime] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the rows of an exported table as dictionaries, in id order.
+
+    Rows are fetched batch_size at a time (a server-side cursor on
+    PostgreSQL), so memory use does not grow with the table.
+
+    Args:
+        table: A key of EXPORT_TABLES.
+        since: Only rows created or changed at or after this time.
+        batch_size: Rows fetched per round trip.
+    """
+    model, timestamp_columns = EXPORT_TABLES[table]
+    query = select(*model.__table__.columns).order_by(model.__table__.c.id)
+    if since is not None:
+        query = query.where(or_(*(model.__table__.c[name] >= since for name in timestamp_columns)))
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for row in result.mappings():
+        yield dict(row)
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def iter_ndjson(tables: List[str], since: Optional[datetime] = None, batch_size: int = 1000) -> Iterator[str]:
+    """Yield NDJSON lines for the given tables; each record names its table."""
+    for table in tables:
+        for row in iter_rows(table, since, batch_size):
+            record = {'table': table}
+            record.update((key, _jsonable(value)) for key, value in row.items())
+            yield json.dumps(record) + '\n'
+
+def iter_csv(table: str, since: Optional[datetime] = None, batch_size: int = 1000) -> Iterator[str]:
+    """Yield a table as CSV text, header first, about batch_size rows per chunk."""
+    names = columns(table)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for count, row in enumerate(iter_rows(table, since, batch_size), start=1):
+        writer.writerow([_jsonable(row[name]) for name in names])
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def write_parquet(table: str, sink: IO[bytes], since: Optional[datetime] = None, batch_size: int = 1000) -> int:
+    """
+    Write a table as Parquet, one row group per batch; needs pyarrow.
+
+    Args:
+        table: A key of EXPORT_TABLES.
+        sink: A binary file object or path.
+        since: Only rows created or changed at or after this time.
+        batch_size: Rows per row group.
+
+    Returns:
+        The number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow; install it with 'pip install pyarrow'")
+
+    model = EXPORT_TABLES[table][0]
+    schema = pa.schema([
+        (column.name, _arrow_type(pa, column.type.python_type)) for column in model.__table__.columns
+    ])
+    written = 0
+    with pq.ParquetWriter(sink, schema) as writer:
+        batch = []
+        for row in iter_rows(table, since, batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                written += len(batch)
+                batch = []
+        if batch or not written:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            written += len(batch)
+    return written
+
+def _arrow_type(pa, python_type):
+    return {
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        datetime: pa.timestamp('us'),
+    }.get(python_type, pa.string())
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from app import db
+from app.models import ChatMessage
+
+SENDER_ROLES = {
+    'user': 'user',
+    'bot': 'assistant'
+}
+
+def history_delta_query(chat_session_id: int, last_message_id: int):
+    """The messages of a session after last_message_id, oldest first."""
+    return db.session.query(ChatMessage.id, ChatMessage.sender, ChatMessage.content).filter(
+        ChatMessage.chat_session_id == chat_session_id,
+        ChatMessage.id > last_message_id
+    ).order_by(ChatMessage.id)
+
+class _HistoryEntry:
+    __slots__ = ('messages', 'last_message_id', 'recorded')
+
+    def __init__(self):
+        # (message id, model message) pairs, oldest first
+        self.messages: List[Tuple[int, Dict[str, str]]] = []
+        # Every message of the session up to this id has been loaded from the database
+        self.last_message_id = 0
+        # Ids of messages added by record() that no lookup has read back yet
+        self.recorded: List[int] = []
+
+class ChatHistoryCache:
+    """
+    Bounded per-process LRU cache of chat histories keyed by chat_session_id.
+
+    Each entry remembers the id up to which it holds every ChatMessage of its
+    session. Lookups only fetch rows newer than that, so a miss loads the
+    whole session once and a stale entry (a turn handled by another worker)
+    catches up cheaply. Messages this process commits are added right away
+    but stay pending: only ids read back from the database move that id
+    forward, so a lookup also fetches anything another worker stored below
+    a message recorded here.
+    """
+
+    def __init__(self, app=None):
+        self.max_sessions = 1024
+        self._entries: "OrderedDict[int, _HistoryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_sessions = app.config.get('CHAT_HISTORY_CACHE_SIZE', self.max_sessions)
+        app.extensions['chat_history_cache'] = self
+
+    def _entry(self, chat_session_id: int) -> _HistoryEntry:
+        entry = self._entries.get(chat_session_id)
+        if entry is None:
+            entry = _HistoryEntry()
+            self._entries[chat_session_id] = entry
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(chat_session_id)
+        return entry
+
+    def get(self, chat_session_id: int) -> List[Dict[str, str]]:
+        """
+        Get the chat history of a session in model message format.
+
+        Args:
+            chat_session_id: The chat session to look up.
+
+        Returns:
+            A new list of {'role', 'content'} dictionaries, oldest first.
+        """
+        with self._lock:
+            entry = self._entry(chat_session_id)
+            last_message_id = entry.last_message_id
+
+        rows = history_delta_query(chat_session_id, last_message_id).all()
+
+        # Update the entry read above even if it was evicted meanwhile, a new one would lack the older rows
+        with self._lock:
+            known = {message_id for message_id, _ in entry.messages}
+            missing = [(message_id, {'role': SENDER_ROLES.get(sender, sender), 'content': content})
+                       for message_id, sender, content in rows if message_id not in known]
+            if missing:
+                entry.messages = sorted(entry.messages + missing, key=lambda item: item[0])
+            # Only rows read back move the watermark; recorded messages stay pending until it passes them
+            entry.last_message_id = max([entry.last_message_id] + [row[0] for row in rows])
+            entry.recorded = [message_id for message_id in entry.recorded if message_id > entry.last_message_id]
+            return [message for _, message in entry.messages]
+
+    def record(self, message: ChatMessage):
+        """Add a freshly committed message to its session's cached history."""
+        with self._lock:
+            entry = self._entries.get(message.chat_session_id)
+            if entry is None or message.id <= entry.last_message_id or message.id in entry.recorded:
+                return
+            entry.messages.append((message.id, {'role': SENDER_ROLES.get(message.sender, message.sender), 'content': message.content}))
+            if len(entry.messages) > 1 and entry.messages[-2][0] > message.id:
+                entry.messages.sort(key=lambda item: item[0])
+            entry.recorded.append(message.id)
+
+    def invalidate(self, chat_session_id: int):
+        """Drop a session from the cache, e.g. once it is completed."""
+        with self._lock:
+            self._entries.pop(chat_session_id, None)
+
+chat_history_cache = ChatHistoryCache()
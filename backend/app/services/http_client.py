@@ -0,0 +1,146 @@
+import asyncio
+import atexit
+import os
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_STREAM_END = object()
+
+class LLMClientPool:
+    """
+    Process-wide async HTTP clients for the LLM backends.
+
+    Each backend origin (scheme, host and port) gets one keep-alive
+    httpx.AsyncClient. All clients live on a single event loop running in a
+    daemon thread, so Flask's synchronous views can submit coroutines with
+    run() or consume async generators with iterate() without building an
+    event loop per request.
+    """
+
+    def __init__(self, app=None):
+        self.max_connections = 20
+        self.max_keepalive_connections = 10
+        self.keepalive_expiry = 30.0
+        self.connect_timeout = 5.0
+        self.read_timeout = 100.0
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Read pool limits and timeouts from the Flask config."""
+        self.max_connections = app.config.get('LLM_POOL_MAX_CONNECTIONS', self.max_connections)
+        self.max_keepalive_connections = app.config.get('LLM_POOL_MAX_KEEPALIVE', self.max_keepalive_connections)
+        self.keepalive_expiry = app.config.get('LLM_POOL_KEEPALIVE_EXPIRY', self.keepalive_expiry)
+        self.connect_timeout = app.config.get('LLM_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('LLM_READ_TIMEOUT', self.read_timeout)
+        app.extensions['llm_client'] = self
+        atexit.register(self.close)
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The background event loop, started lazily and restarted after a fork."""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                # Clients and loops inherited from a parent process are unusable
+                self._clients = {}
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name='llm-client-loop',
+                    daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._loop
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """
+        Get the pooled client for the origin of the given URL.
+
+        Must be called from the background loop, which owns the clients.
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        client = self._clients.get(origin)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=origin,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            )
+            self._clients[origin] = client
+            logger.info("Created LLM HTTP client", extra={'origin': origin})
+        return client
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the shared loop and block until it finishes."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """
+        Consume an async generator from synchronous code.
+
+        Items are handed over through a queue as the generator produces them,
+        so a streaming response can be relayed without buffering. Closing the
+        returned iterator early cancels the producer.
+        """
+        items: queue.Queue = queue.Queue()
+
+        async def produce():
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+            finally:
+                items.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self.loop)
+        try:
+            while True:
+                item = items.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def close(self):
+        """Close all pooled connections and stop the background loop."""
+        with self._lock:
+            loop, clients = self._loop, list(self._clients.values())
+            if loop is None or self._pid != os.getpid():
+                return
+            self._clients = {}
+            self._loop = None
+
+        async def close_clients():
+            for client in clients:
+                await client.aclose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_clients(), loop).result(5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+llm_client = LLMClientPool()
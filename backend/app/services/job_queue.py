@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app import db
+from app.models import ChatMessage, GenerationJob, LanguageModel, PromptType, UseCase
+from app.services.chat_service import ChatService
+from app.services.history_cache import chat_history_cache
+from app.services.progress import evaluation_progress
+from app.services.admission import admission_control
+from app.logging_config import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+def queued_jobs():
+    """The ids of queued jobs, oldest first."""
+    return db.session.query(GenerationJob.id).filter_by(status='queued').order_by(GenerationJob.created_at)
+
+def stale_jobs(started_before: datetime):
+    """Running jobs started before the given time."""
+    return GenerationJob.query.filter(
+        GenerationJob.status == 'running',
+        GenerationJob.started_at < started_before
+    )
+
+class GenerationQueue:
+    """
+    Database-backed queue of bot replies with an in-process worker pool.
+
+    The request thread only stores the user message and a GenerationJob row,
+    then returns the job id. Worker threads in every process claim queued
+    jobs with a conditional UPDATE, so any gunicorn worker may pick up a job
+    and any worker can answer a poll for it. The table lives in the app
+    database, so SQLite works without extra services. Jobs left running by a
+    crashed process are re-queued once they are older than stale_after.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 4
+        self.poll_interval = 1.0
+        self.stale_after = 300.0
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._pid: Optional[int] = None
+        self._last_requeue = float('-inf')
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', self.poll_interval)
+        self.stale_after = app.config.get('JOB_STALE_AFTER', self.stale_after)
+        app.extensions['generation_queue'] = self
+
+    def start(self):
+        """Start this process's worker threads, once per process."""
+        if self.workers <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'generation-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        logger.info("Generation workers started", extra={'workers': self.workers})
+
+    def enqueue(self, chat_session_id: int, user_message_id: int) -> GenerationJob:
+        """
+        Queue the bot reply to a stored user message.
+
+        Args:
+            chat_session_id: The chat session the reply belongs to.
+            user_message_id: The already committed user ChatMessage.
+
+        Returns:
+            The committed GenerationJob.
+        """
+        self.start()
+        job = GenerationJob(
+            id=str(uuid.uuid4()),
+            chat_session_id=chat_session_id,
+            user_message_id=user_message_id,
+            status='queued'
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._wakeup.set()
+        return job
+
+    def _requeue_stale(self):
+        """Put jobs abandoned by a dead process back in the queue; runs at most every stale_after / 2 seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_requeue < self.stale_after / 2:
+                return
+            self._last_requeue = now
+
+        stale = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        requeued = stale_jobs(stale).update({'status': 'queued'}, synchronize_session=False)
+        db.session.commit()
+        if requeued:
+            logger.warning("Re-queued stale generation jobs", extra={'jobs': requeued})
+
+    def _claim(self) -> Optional[str]:
+        """Atomically move the oldest queued job to running and return its id."""
+        self._requeue_stale()
+
+        candidate = queued_jobs().first()
+        if candidate is None:
+            db.session.commit()
+            return None
+
+        claimed = GenerationJob.query.filter_by(id=candidate.id, status='queued') \
+            .update({'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return candidate.id if claimed else None
+
+    def _work(self):
+        while True:
+            job_id = None
+            try:
+                with self.app.app_context():
+                    job_id = self._claim()
+                    if job_id is not None:
+                        self._run(job_id)
+            except Exception as e:
+                log_exception(logger, e, {'job_id': job_id})
+
+            if job_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _run(self, job_id: str):
+        """Generate and store the reply of a claimed job, marking the job failed on any error."""
+        try:
+            self._generate(job_id)
+        except Exception as e:
+            db.session.rollback()
+            GenerationJob.query.filter_by(id=job_id, status='running').update(
+                {'status': 'failed', 'error': (str(e) or type(e).__name__)[:500], 'finished_at': datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.session.commit()
+            raise
+
+    def _generate(self, job_id: str):
+        job = db.session.get(GenerationJob, job_id)
+        claimed_at = job.started_at
+        chat_session = evaluation_progress.session_config(job.chat_session_id)
+        if chat_session is None:
+            raise LookupError(f"Chat session {job.chat_session_id} not found")
+
+        chat_service = ChatService(
+            language_model=LanguageModel(chat_session.language_model),
+            use_case=UseCase(chat_session.use_case),
+            prompt_type=PromptType(chat_session.prompt_type)
+        )
+        # The user message was committed before the job, so the history already ends with it
+        chat_history = chat_history_cache.get(chat_session.id)
+        chat_session_id = chat_session.id
+        # Give the connection back to the pool while the model generates
+        db.session.commit()
+
+        # Workers wait for a model slot instead of being rejected; the queue is their backlog
+        with admission_control.acquire(chat_service.language_model, queued=False):
+            # The wait has no deadline, so only now does the job count as started. If it was
+            # re-queued as stale meanwhile, another worker owns it and this one drops it.
+            still_ours = GenerationJob.query.filter_by(id=job_id, status='running', started_at=claimed_at) \
+                .update({'started_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if not still_ours:
+                logger.warning("Dropped generation job taken over while waiting for a slot", extra={'job_id': job_id})
+                return
+            result = chat_service.process_chat_sync(chat_history)
+
+        if result['success']:
+            bot_message = ChatMessage(
+                chat_session_id=chat_session_id,
+                sender='bot',
+                content=result['content']
+            )
+            db.session.add(bot_message)
+            db.session.flush()
+            job.bot_message_id = bot_message.id
+            job.reasoning = result.get('reasoning')
+            job.status = 'done'
+        else:
+            job.status = 'failed'
+            job.error = result['error'][:500]
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+        if result['success']:
+            chat_history_cache.record(bot_message)
+        else:
+            logger.error(
+                "Generation job failed",
+                extra={'job_id': job_id, 'chat_session_id': chat_session_id, 'error': result['error']}
+            )
+
+generation_queue = GenerationQueue()
@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app import db
+from app.models import ChatMessage
+from app.logging_config import get_logger
+from app.services.tracing import tracer
+
+logger = get_logger(__name__)
+
+class _PendingWrite:
+    def __init__(self, row: Dict):
+        self.row = row
+        self.id: Optional[int] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+class MessageWriter:
+    """
+    Group commit for chat messages.
+
+    Request threads hand their message to a single flusher thread per process
+    and block until it is committed, so a message is durable before the
+    response goes out. The flusher takes whatever queued up while the last
+    commit was running, waits at most flush_interval for more, and inserts
+    the batch with one multi-row INSERT ... RETURNING and one commit on a
+    connection it keeps for itself, so it never waits on the pool that the
+    blocked request threads are holding. Under load many turns share a
+    commit (and its fsync); when idle a message is committed almost at once.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.flush_interval = 0.002
+        self.max_batch = 100
+        self._queue: Optional[queue.Queue] = None
+        self._connection = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('MESSAGE_GROUP_COMMIT', self.enabled)
+        self.flush_interval = app.config.get('MESSAGE_FLUSH_INTERVAL', self.flush_interval)
+        self.max_batch = app.config.get('MESSAGE_FLUSH_MAX_BATCH', self.max_batch)
+        app.extensions['message_writer'] = self
+
+    def _start(self) -> queue.Queue:
+        """Start this process's flusher thread, once per process."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._connection = None
+                threading.Thread(target=self._flush_forever, name='message-writer', daemon=True).start()
+            return self._queue
+
+    def write(self, chat_session_id: int, sender: str, content: str) -> ChatMessage:
+        """
+        Store a chat message and wait until it is committed.
+
+        Args:
+            chat_session_id: The chat session the message belongs to.
+            sender: 'user' or 'bot'.
+            content: The message text.
+
+        Returns:
+            A detached ChatMessage with its id and timestamp set.
+        """
+        row = {
+            'chat_session_id': chat_session_id,
+            'sender': sender,
+            'content': content,
+            'timestamp': datetime.utcnow()
+        }
+        with tracer.span('MessageWriter.write', sender=sender, group_commit=self.enabled):
+            if not self.enabled:
+                message = ChatMessage(**row)
+                db.session.add(message)
+                db.session.commit()
+                return message
+
+            pending = _PendingWrite(row)
+            self._start().put(pending)
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return ChatMessage(id=pending.id, **row)
+
+    def _flush_forever(self):
+        pending_writes = self._queue
+        while True:
+            batch = [pending_writes.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(pending_writes.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _insert(self, batch: List[_PendingWrite]):
+        if self._connection is None:
+            self._connection = db.engine.connect()
+        table = ChatMessage.__table__
+        try:
+            with self._connection.begin():
+                ids = self._connection.execute(
+                    insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                    [pending.row for pending in batch]
+                ).scalars().all()
+        except Exception:
+            # Start over on a fresh connection in case this one is broken
+            self._connection.close()
+            self._connection = None
+            raise
+        for pending, message_id in zip(batch, ids):
+            pending.id = message_id
+
+    def _flush(self, batch: List[_PendingWrite]):
+        try:
+            with self.app.app_context():
+                try:
+                    self._insert(batch)
+                except Exception as e:
+                    if len(batch) == 1:
+                        raise
+                    # Don't let one bad row fail everyone else's messages
+                    logger.warning("Group commit failed, retrying rows one by one", extra={'batch': len(batch), 'error': str(e)})
+                    for pending in batch:
+                        try:
+                            self._insert([pending])
+                        except Exception as row_error:
+                            pending.error = row_error
+        except Exception as e:
+            for pending in batch:
+                pending.error = pending.error or e
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+message_writer = MessageWriter()
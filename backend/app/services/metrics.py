@@ -0,0 +1,344 @@
+import atexit
+import bisect
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Latency buckets in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# Where the values of exited processes are kept, with the names of the files folded into them
+TOTALS_FILE = 'totals.json'
+
+# SQL statements are labelled by their first keyword; anything else counts as OTHER
+_SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE'}
+
+class _Metric:
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+class Counter(_Metric):
+    """A monotonically increasing count per label combination."""
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.registry._start()
+        with self.registry._lock:
+            values = self.registry._values[self.name]
+            values[key] = values.get(key, 0) + amount
+            self.registry._dirty = True
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets per label combination, plus their sum."""
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets: Sequence[float]):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        self.registry._start()
+        with self.registry._lock:
+            values = self.registry._values[self.name]
+            series = values.get(key)
+            if series is None:
+                # Counts per bucket (the last one is +Inf), then the sum
+                series = values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+            self.registry._dirty = True
+
+class MetricsRegistry:
+    """
+    Counters and fixed-bucket histograms, aggregated across worker processes.
+
+    Each process updates its own values in memory under a lock, and a
+    background thread writes them to a JSON file of its own in directory
+    every flush_interval seconds when they changed. The Prometheus text
+    rendered for /api/metrics sums the files of all processes, so totals
+    survive worker restarts; other workers' values are at most
+    flush_interval seconds old. On each scrape the files of processes that
+    no longer exist are added into one totals file and deleted, so the
+    directory does not grow with every restart. That is only right for
+    counters and histograms; a gauge of an exited process would have to be
+    dropped instead. Without fcntl (Windows) the files are never compacted.
+    """
+
+    def __init__(self, app=None):
+        self.directory = os.path.join(tempfile.gettempdir(), 'chatbot-eval-metrics')
+        self.flush_interval = 5.0
+        self._metrics: Dict[str, _Metric] = {}
+        self._values: Dict[str, Dict[Tuple[str, ...], object]] = {}
+        self._dirty = False
+        self._path: Optional[str] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('METRICS_DIR') or self.directory
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['metrics'] = self
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = REQUEST_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric):
+        self._metrics[metric.name] = metric
+        self._values[metric.name] = {}
+        return metric
+
+    def _start(self):
+        """Start this process's flusher, once per process; values inherited through fork are dropped."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._path = os.path.join(self.directory, f"{self._pid}-{uuid.uuid4().hex[:8]}.json")
+                for values in self._values.values():
+                    values.clear()
+                threading.Thread(target=self._flush_forever, name='metrics-flusher', daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Writing metrics failed: {e}")
+
+    def flush(self):
+        """Write this process's values to its file if they changed since the last write."""
+        self._start()
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {name: [[list(key), value] for key, value in values.items()]
+                        for name, values in self._values.items()}
+            self._dirty = False
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temporary, self._path)
+
+    @contextmanager
+    def _totals_lock(self):
+        """Hold the lock that serializes compaction and collection across processes."""
+        fd = os.open(os.path.join(self.directory, 'totals.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _read_totals(self) -> Tuple[Dict[str, Dict[Tuple[str, ...], object]], List[str]]:
+        """The values folded into the totals file, and the names of the files they include."""
+        try:
+            with open(os.path.join(self.directory, TOTALS_FILE)) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}, []
+        values = {name: {tuple(key): value for key, value in series} for name, series in state['metrics'].items()}
+        return values, state['merged']
+
+    def _compact(self):
+        """Add the files of exited processes to the totals file, then delete them; call with the totals lock held."""
+        dead = [path for path in glob.glob(os.path.join(self.directory, '*.json')) if not _process_alive(path)]
+        if not dead:
+            return
+        values, merged = self._read_totals()
+        merged = set(merged)
+        for path in dead:
+            name = os.path.basename(path)
+            if name in merged:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            _merge(values, snapshot)
+            merged.add(name)
+
+        # The names are kept until the files are gone, so a crash before the deletes cannot count them twice
+        merged = sorted(name for name in merged if os.path.exists(os.path.join(self.directory, name)))
+        path = os.path.join(self.directory, TOTALS_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({
+                'merged': merged,
+                'metrics': {name: [[list(key), value] for key, value in series.items()]
+                            for name, series in values.items()}
+            }, f)
+        os.replace(path + '.tmp', path)
+        for name in merged:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _collect(self) -> Dict[str, Dict[Tuple[str, ...], object]]:
+        if fcntl is None:
+            return self._collect_files()
+        with self._totals_lock():
+            self._compact()
+            return self._collect_files()
+
+    def _collect_files(self) -> Dict[str, Dict[Tuple[str, ...], object]]:
+        totals: Dict[str, Dict[Tuple[str, ...], object]] = {name: {} for name in self._metrics}
+        folded, merged = self._read_totals()
+        _merge(totals, {name: list(series.items()) for name, series in folded.items()}, only=self._metrics)
+        skipped = set(merged) | {TOTALS_FILE}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            if os.path.basename(path) in skipped:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            _merge(totals, snapshot, only=self._metrics)
+        return totals
+
+    def render(self) -> str:
+        """
+        Render the metrics of all processes in the Prometheus text format.
+
+        Returns:
+            The exposition text, version 0.0.4.
+        """
+        self.flush()
+        totals = self._collect()
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for key in sorted(totals[name]):
+                labels = list(zip(metric.labelnames, key))
+                value = totals[name][key]
+                if metric.type == 'counter':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric.buckets) + [math.inf], value[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {_number(cumulative)}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {_number(cumulative)}")
+        return '\n'.join(lines) + '\n'
+
+def _merge(totals: Dict[str, Dict[Tuple[str, ...], object]], snapshot: Dict[str, list], only=None):
+    """Add the [key, value] series of a snapshot into totals, optionally only for the named metrics."""
+    for name, series in snapshot.items():
+        if only is not None and name not in only:
+            continue
+        values = totals.setdefault(name, {})
+        for key, value in series:
+            key = tuple(key)
+            current = values.get(key)
+            if current is None:
+                values[key] = value
+            elif isinstance(value, list):
+                # Histograms whose buckets changed since the other values were written are not added up
+                if len(value) == len(current):
+                    values[key] = [a + b for a, b in zip(current, value)]
+            else:
+                values[key] = current + value
+
+def _process_alive(path: str) -> bool:
+    """Whether the process that writes a {pid}-{id}.json metrics file still exists; the totals file counts as alive."""
+    try:
+        pid = int(os.path.basename(path).split('-', 1)[0])
+    except ValueError:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+metrics = MetricsRegistry()
+
+@atexit.register
+def _flush_at_exit():
+    if metrics._pid == os.getpid():
+        metrics.flush()
+
+http_requests = metrics.counter(
+    'http_requests_total', 'HTTP requests by route, method and status.', ('route', 'method', 'status')
+)
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route and method.', ('route', 'method'), REQUEST_BUCKETS
+)
+llm_request_duration = metrics.histogram(
+    'llm_request_duration_seconds', 'LLM reply latency by language model, mode and outcome.',
+    ('language_model', 'mode', 'outcome'), LLM_BUCKETS
+)
+db_query_duration = metrics.histogram(
+    'db_query_duration_seconds', 'SQL statement latency by operation.', ('operation',), DB_BUCKETS
+)
+db_errors = metrics.counter('db_errors_total', 'SQL statements that raised an error, by operation.', ('operation',))
+
+def sql_operation(statement: str) -> str:
+    """The operation label of a SQL statement; the statements are timed by app.query_stats."""
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    return keyword if keyword in _SQL_OPERATIONS else 'OTHER'
+
+def llm_outcome(result: Dict) -> str:
+    """Label a process_chat result or terminal stream event."""
+    if result.get('cached'):
+        return 'cached'
+    if result.get('unavailable'):
+        return 'unavailable'
+    return 'success' if result.get('success', result.get('type') == 'done') else 'error'
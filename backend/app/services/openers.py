@@ -0,0 +1,206 @@
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+from app import db
+from app.models import ChatMessage, ChatSession, GenerationJob, LanguageModel, PreparedOpener, PromptType, UseCase
+from app.services.chat_service import ChatService
+from app.services.history_cache import chat_history_cache
+from app.services.job_queue import generation_queue
+from app.services.admission import admission_control
+from app.logging_config import get_logger, log_exception
+
+logger = get_logger(__name__)
+
+# The user turn that asks the bot to open the conversation
+OPENING_PROMPT = "Introduce yourself to the user"
+
+class OpenerPool:
+    """
+    Opening bot messages for new chat sessions, generated ahead of time.
+
+    start_opening stores the opening prompt for a session and either hands it
+    a ready opener from the pool of its (model, use case, prompt type) cell,
+    finishing at once, or queues the reply on the generation queue. Either
+    way the client waits on the returned GenerationJob. One process on the
+    host (holding a lock file) keeps pool_size openers per cell, generating
+    only when a model slot is free so participants are never held up, and
+    discards openers older than max_age so prompt or model changes show up.
+    A pool_size of 0 turns the pool off; openers are then generated per
+    session in the background.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.pool_size = 2
+        self.max_age = 24 * 3600.0
+        self.refill_interval = 30.0
+        self.lock_dir = os.path.join(tempfile.gettempdir(), 'chatbot-eval-admission')
+        self._wakeup = threading.Event()
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.pool_size = app.config.get('OPENER_POOL_SIZE', self.pool_size)
+        self.max_age = app.config.get('OPENER_MAX_AGE', self.max_age)
+        self.refill_interval = app.config.get('OPENER_REFILL_INTERVAL', self.refill_interval)
+        self.lock_dir = app.config.get('ADMISSION_LOCK_DIR') or self.lock_dir
+        app.extensions['opener_pool'] = self
+
+    def start(self):
+        """Start this process's refill thread, once per process."""
+        if self.pool_size <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._refill_forever, name='opener-refill', daemon=True).start()
+
+    def start_opening(self, chat_session: ChatSession) -> GenerationJob:
+        """
+        Store the opening prompt of a new chat session and provide the bot's reply.
+
+        Args:
+            chat_session: The committed, still empty chat session.
+
+        Returns:
+            The GenerationJob for the opening message; already done if a
+            prepared opener was available, queued otherwise.
+        """
+        self.start()
+        user_message = ChatMessage(chat_session_id=chat_session.id, sender='user', content=OPENING_PROMPT)
+        db.session.add(user_message)
+        db.session.flush()
+
+        opener = self._claim(chat_session)
+        if opener is None:
+            db.session.commit()
+            chat_history_cache.record(user_message)
+            return generation_queue.enqueue(chat_session.id, user_message.id)
+
+        bot_message = ChatMessage(chat_session_id=chat_session.id, sender='bot', content=opener.content)
+        db.session.add(bot_message)
+        db.session.flush()
+        now = datetime.utcnow()
+        job = GenerationJob(
+            id=str(uuid.uuid4()),
+            chat_session_id=chat_session.id,
+            user_message_id=user_message.id,
+            bot_message_id=bot_message.id,
+            status='done',
+            reasoning=opener.reasoning,
+            started_at=now,
+            finished_at=now
+        )
+        db.session.add(job)
+        db.session.commit()
+        chat_history_cache.record(user_message)
+        chat_history_cache.record(bot_message)
+        self._wakeup.set()
+        return job
+
+    def fresh(self, language_model: str, use_case: str, prompt_type: str):
+        """The openers of a cell that are young enough to serve, oldest first."""
+        return PreparedOpener.query.filter(
+            PreparedOpener.language_model == language_model,
+            PreparedOpener.use_case == use_case,
+            PreparedOpener.prompt_type == prompt_type,
+            PreparedOpener.created_at >= datetime.utcnow() - timedelta(seconds=self.max_age)
+        ).order_by(PreparedOpener.created_at)
+
+    def _claim(self, chat_session: ChatSession) -> Optional[PreparedOpener]:
+        """Take the oldest fresh opener of the session's cell out of the pool, if any."""
+        if self.pool_size <= 0:
+            return None
+        candidates = self.fresh(chat_session.language_model, chat_session.use_case, chat_session.prompt_type) \
+            .limit(3).all()
+        for opener in candidates:
+            # Another worker may take the same row; only the one whose DELETE hits it wins
+            if PreparedOpener.query.filter_by(id=opener.id).delete(synchronize_session=False):
+                return opener
+        return None
+
+    def _refill_forever(self):
+        leader = None
+        while True:
+            try:
+                if leader is None:
+                    leader = self._become_leader()
+                if leader is not None:
+                    with self.app.app_context():
+                        self._refill()
+            except Exception as e:
+                log_exception(logger, e)
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
+
+    def _become_leader(self):
+        """Return a held lock if this process should refill the pool, else None."""
+        if fcntl is None:
+            return True
+        os.makedirs(self.lock_dir, exist_ok=True)
+        fd = os.open(os.path.join(self.lock_dir, 'opener-refill.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        # Held for the life of the process; the kernel releases it if the process dies
+        logger.info("Refilling prepared openers in this process", extra={'pid': os.getpid()})
+        return fd
+
+    def _refill(self):
+        PreparedOpener.query.filter(
+            PreparedOpener.created_at < datetime.utcnow() - timedelta(seconds=self.max_age)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        for language_model in LanguageModel:
+            cells = [(use_case, prompt_type) for use_case in UseCase for prompt_type in PromptType]
+            for use_case, prompt_type in cells:
+                missing = self.pool_size - self.fresh(language_model.value, use_case.value, prompt_type.value).count()
+                db.session.commit()
+                if any(not self._generate(language_model, use_case, prompt_type) for _ in range(missing)):
+                    # Busy or failing; leave this model alone until the next round
+                    break
+
+    def _generate(self, language_model: LanguageModel, use_case: UseCase, prompt_type: PromptType) -> bool:
+        """Generate and store one opener; returns False if the model is busy or failing."""
+        chat_service = ChatService(language_model=language_model, use_case=use_case, prompt_type=prompt_type)
+        # Only use capacity that live sessions leave idle
+        slot = admission_control.try_acquire(language_model)
+        if slot is None:
+            return False
+        with slot:
+            result = chat_service.process_chat_sync([{'role': 'user', 'content': OPENING_PROMPT}])
+
+        if not result['success']:
+            logger.warning(
+                "Failed to prepare opener",
+                extra={'language_model': language_model.value, 'use_case': use_case.value, 'error': result['error']}
+            )
+            return False
+
+        db.session.add(PreparedOpener(
+            language_model=language_model.value,
+            use_case=use_case.value,
+            prompt_type=prompt_type.value,
+            content=result['content'],
+            reasoning=result.get('reasoning')
+        ))
+        db.session.commit()
+        return True
+
+opener_pool = OpenerPool()
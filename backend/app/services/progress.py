@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, NamedTuple, Optional
+
+from app import db
+from app.models import ChatSession
+
+class SessionConfig(NamedTuple):
+    """The fixed, randomised configuration of a chat session."""
+    id: int
+    evaluation_id: int
+    language_model: str
+    use_case: str
+    prompt_type: str
+
+    @classmethod
+    def of(cls, chat_session: ChatSession) -> 'SessionConfig':
+        return cls(chat_session.id, chat_session.evaluation_id, chat_session.language_model,
+                   chat_session.use_case, chat_session.prompt_type)
+
+def completed_use_cases_query(evaluation_id: int, known: FrozenSet[str] = frozenset()):
+    """The use cases of an evaluation's completed chat sessions, leaving out those already known."""
+    query = db.session.query(ChatSession.use_case).filter_by(evaluation_id=evaluation_id, completed=True)
+    if known:
+        query = query.filter(ChatSession.use_case.notin_(known))
+    return query
+
+class EvaluationProgressCache:
+    """
+    Bounded per-process LRU caches of session configurations and evaluation progress.
+
+    A session's configuration never changes after it starts, so once cached
+    it is served without touching the database. The set of completed use
+    cases of an evaluation only grows; a lookup asks the database just for
+    completed use cases it does not know yet (an indexed query that is
+    usually empty), so a completion handled by another worker is still seen.
+    """
+
+    def __init__(self, app=None):
+        self.max_entries = 4096
+        self._sessions: "OrderedDict[int, SessionConfig]" = OrderedDict()
+        self._completed: "OrderedDict[int, FrozenSet[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('PROGRESS_CACHE_SIZE', self.max_entries)
+        app.extensions['evaluation_progress'] = self
+
+    def _store(self, entries: OrderedDict, key: int, value):
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def session_config(self, chat_session_id) -> Optional[SessionConfig]:
+        """
+        Get a chat session's configuration.
+
+        Args:
+            chat_session_id: The chat session to look up.
+
+        Returns:
+            The SessionConfig, or None if the session does not exist.
+        """
+        try:
+            chat_session_id = int(chat_session_id)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            config = self._sessions.get(chat_session_id)
+            if config is not None:
+                self._sessions.move_to_end(chat_session_id)
+                return config
+
+        chat_session = db.session.get(ChatSession, chat_session_id)
+        if chat_session is None:
+            return None
+        config = SessionConfig.of(chat_session)
+        self._store(self._sessions, chat_session_id, config)
+        return config
+
+    def session_started(self, chat_session: ChatSession):
+        """Cache a freshly committed chat session."""
+        self._store(self._sessions, chat_session.id, SessionConfig.of(chat_session))
+
+    def completed_use_cases(self, evaluation_id: int) -> FrozenSet[str]:
+        """Get the use cases of an evaluation whose chat sessions are completed."""
+        with self._lock:
+            known = self._completed.get(evaluation_id, frozenset())
+
+        new = {use_case for use_case, in completed_use_cases_query(evaluation_id, known).all()}
+        if not new and evaluation_id in self._completed:
+            return known
+
+        completed = known | new
+        self._store(self._completed, evaluation_id, completed)
+        return completed
+
+    def session_completed(self, config: SessionConfig):
+        """Record a chat session completed in this process."""
+        with self._lock:
+            known = self._completed.get(config.evaluation_id)
+        if known is not None:
+            self._store(self._completed, config.evaluation_id, known | {config.use_case})
+
+evaluation_progress = EvaluationProgressCache()
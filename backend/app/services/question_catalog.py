@@ -0,0 +1,123 @@
+import hashlib
+import threading
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from app.models import Question, QuestionType
+
+# The surveys a participant answers, before and after each chat session
+SURVEY_TYPES = ('pre', 'post')
+
+class SurveyCatalog:
+    """The serialized question list of one survey type, with its ETag."""
+
+    def __init__(self, body: bytes, etag: str, required_ids: FrozenSet[int], likert_ids: FrozenSet[int]):
+        self.body = body
+        self.etag = etag
+        self.required_ids = required_ids
+        self.likert_ids = likert_ids
+
+def catalog_version_query():
+    """The question count, highest id and latest updated_at, which change whenever the catalog does."""
+    return db.session.query(func.count(Question.id), func.max(Question.id), func.max(Question.updated_at))
+
+def survey_questions(survey_type: str):
+    """The active questions of a survey, in order."""
+    return Question.query.filter_by(active=True, survey_type=survey_type).order_by(Question.order)
+
+class QuestionCatalog:
+    """
+    Per-process cache of the survey question catalog.
+
+    The questions only change when seed.py runs, but every participant loads
+    them several times and every survey submission checks the required ones.
+    Each survey type is kept as its finished JSON body plus an ETag. The
+    catalog version (question count, highest id and latest updated_at) is
+    re-read at most every ttl seconds; when it changed, everything is rebuilt
+    on next use. So a re-seed reaches every process within ttl seconds
+    without any cross-process signalling.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 60.0
+        self._version: Optional[Tuple] = None
+        self._checked_at = float('-inf')
+        self._surveys: Dict[str, SurveyCatalog] = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('QUESTION_CACHE_TTL', self.ttl)
+        self.invalidate()
+        app.extensions['question_catalog'] = self
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.ttl:
+            return
+        version = tuple(catalog_version_query().one())
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._surveys = {}
+            self._checked_at = now
+
+    def survey(self, survey_type: str) -> SurveyCatalog:
+        """
+        Get the active questions of a survey, serialized as the /questions response.
+
+        Args:
+            survey_type: 'pre' or 'post'.
+
+        Returns:
+            The SurveyCatalog, built on first use after each catalog change.
+
+        Raises:
+            ValueError: If survey_type is not one of SURVEY_TYPES, so that
+                arbitrary strings do not each get a cache entry.
+        """
+        if survey_type not in SURVEY_TYPES:
+            raise ValueError(f"Unknown survey type: {survey_type}")
+        self._check_version()
+        cached = self._surveys.get(survey_type)
+        if cached is not None:
+            return cached
+
+        questions = survey_questions(survey_type).all()
+        body = current_app.json.dumps({'questions': [q.to_dict() for q in questions]}).encode('utf-8')
+        etag = hashlib.sha256(repr(self._version).encode('utf-8') + body).hexdigest()[:32]
+        cached = SurveyCatalog(
+            body,
+            etag,
+            frozenset(q.id for q in questions if q.required),
+            frozenset(q.id for q in questions if q.type == QuestionType.LIKERT.value)
+        )
+        with self._lock:
+            self._surveys[survey_type] = cached
+        return cached
+
+    def required_ids(self, survey_type: str) -> FrozenSet[int]:
+        """
+        Get the ids of the active, required questions of a survey.
+
+        Args:
+            survey_type: 'pre' or 'post'.
+
+        Returns:
+            A frozenset of question ids.
+        """
+        return self.survey(survey_type).required_ids
+
+    def invalidate(self):
+        """Forget everything cached in this process, e.g. after re-seeding."""
+        with self._lock:
+            self._version = None
+            self._checked_at = float('-inf')
+            self._surveys = {}
+
+question_catalog = QuestionCatalog()
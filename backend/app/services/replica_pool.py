@@ -0,0 +1,246 @@
+import asyncio
+import os
+import random
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from app.models import LanguageModel
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.http_client import llm_client
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+class NoReplicaAvailable(Exception):
+    """Every replica of a model is currently rejecting calls."""
+
+class Replica:
+    """One backend serving a language model, e.g. an Ollama host."""
+
+    def __init__(self, url: str, breaker: CircuitBreaker):
+        self.url = url
+        self.breaker = breaker
+        self.in_flight = 0
+        self.healthy = True
+        self.probe_failures = 0
+
+    @property
+    def origin(self) -> str:
+        parts = urlsplit(self.url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'in_flight': self.in_flight,
+            'healthy': self.healthy,
+            'breaker': self.breaker.state
+        }
+
+class ReplicaCall:
+    """A call reserved on a replica, remembering whether it is the replica's half-open breaker trial."""
+    __slots__ = ('replica', 'trial')
+
+    def __init__(self, replica: Replica, trial: bool):
+        self.replica = replica
+        self.trial = trial
+
+    @property
+    def url(self) -> str:
+        return self.replica.url
+
+class ReplicaPool:
+    """The replicas of a single language model."""
+
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+
+    def choose(self, exclude: Optional[List[Replica]] = None) -> Replica:
+        """
+        Pick the healthy replica with the fewest in-flight calls.
+
+        Replicas with an open circuit breaker are skipped. Ties are broken
+        randomly so idle replicas share the load. If every remaining replica
+        failed its health probe, they are all considered again rather than
+        failing outright.
+
+        Raises:
+            NoReplicaAvailable: If no replica outside exclude accepts calls.
+        """
+        candidates = [r for r in self.replicas if r not in (exclude or []) and r.breaker.available]
+        if not candidates:
+            raise NoReplicaAvailable("No language model backend is available, please retry later")
+        healthy = [r for r in candidates if r.healthy] or candidates
+        least = min(r.in_flight for r in healthy)
+        return random.choice([r for r in healthy if r.in_flight == least])
+
+class ReplicaRouter:
+    """
+    Routes LLM calls to the least-loaded healthy replica of each model.
+
+    Replicas are configured per model in LLM_REPLICAS. A background task on
+    the shared client loop probes every replica and takes those that fail
+    out of rotation until they answer again, while a circuit breaker per
+    replica makes calls fail fast after repeated errors or timeouts. Recent
+    call latencies are kept per model to decide when to hedge. All state is
+    only touched from the client loop, so it needs no locking.
+    """
+
+    def __init__(self, app=None):
+        self.pools: Dict[LanguageModel, ReplicaPool] = {}
+        self.health_path = '/api/tags'
+        self.health_interval = 15.0
+        self.health_timeout = 3.0
+        self.failure_threshold = 2
+        self.hedging = False
+        self.hedge_percentile = 95.0
+        self.hedge_min_samples = 20
+        self.hedge_min_delay = 2.0
+        self._latencies: Dict[LanguageModel, Deque[float]] = {}
+        self._probe_pid: Optional[int] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        breaker_threshold = app.config.get('LLM_BREAKER_FAILURE_THRESHOLD', 3)
+        breaker_reset = app.config.get('LLM_BREAKER_RESET_TIMEOUT', 30.0)
+
+        # Models served by the same host share its Replica, so load is counted per host
+        replicas_by_url: Dict[str, Replica] = {}
+        self.pools = {}
+        for model in LanguageModel:
+            urls = app.config.get('LLM_REPLICAS', {}).get(model.value)
+            if urls:
+                self.pools[model] = ReplicaPool([
+                    replicas_by_url.setdefault(url, Replica(url, CircuitBreaker(breaker_threshold, breaker_reset)))
+                    for url in urls
+                ])
+        self._latencies = {model: deque(maxlen=200) for model in self.pools}
+
+        self.health_path = app.config.get('LLM_HEALTH_PATH', self.health_path)
+        self.health_interval = app.config.get('LLM_HEALTH_INTERVAL', self.health_interval)
+        self.health_timeout = app.config.get('LLM_HEALTH_TIMEOUT', self.health_timeout)
+        self.failure_threshold = app.config.get('LLM_HEALTH_FAILURE_THRESHOLD', self.failure_threshold)
+        self.hedging = app.config.get('LLM_HEDGE_ENABLED', self.hedging)
+        self.hedge_percentile = app.config.get('LLM_HEDGE_PERCENTILE', self.hedge_percentile)
+        self.hedge_min_samples = app.config.get('LLM_HEDGE_MIN_SAMPLES', self.hedge_min_samples)
+        self.hedge_min_delay = app.config.get('LLM_HEDGE_MIN_DELAY', self.hedge_min_delay)
+        app.extensions['replica_router'] = self
+
+    def pool(self, language_model: LanguageModel) -> ReplicaPool:
+        if language_model not in self.pools:
+            raise KeyError(f"No replicas configured for language model '{language_model.value}'")
+        return self.pools[language_model]
+
+    def reserve(self, language_model: LanguageModel, exclude: Optional[List[Replica]] = None) -> ReplicaCall:
+        """
+        Pick a replica and count the call against it; pair with release().
+
+        Must be called from the shared client loop.
+
+        Raises:
+            NoReplicaAvailable: If every candidate's circuit breaker is open.
+        """
+        self._ensure_probing()
+        replica = self.pool(language_model).choose(exclude)
+        call = ReplicaCall(replica, replica.breaker.acquire())
+        replica.in_flight += 1
+        return call
+
+    def release(self, call: ReplicaCall):
+        call.replica.in_flight -= 1
+        call.replica.breaker.release(call.trial)
+        call.trial = False
+
+    @asynccontextmanager
+    async def acquire(self, language_model: LanguageModel,
+                      exclude: Optional[List[Replica]] = None) -> AsyncIterator[ReplicaCall]:
+        """Reserve the least-loaded replica of a model for the duration of a call."""
+        call = self.reserve(language_model, exclude)
+        try:
+            yield call
+        finally:
+            self.release(call)
+
+    def mark_failed(self, call: ReplicaCall):
+        """Record a failed call against the replica's circuit breaker."""
+        replica = call.replica
+        if replica.breaker.record_failure(call.trial):
+            logger.warning(
+                "Circuit breaker opened for LLM replica",
+                extra={'replica': replica.url, 'consecutive_failures': replica.breaker.consecutive_failures}
+            )
+        call.trial = False
+
+    def mark_succeeded(self, call: ReplicaCall):
+        replica = call.replica
+        if call.trial and replica.breaker.opened_at is not None:
+            logger.info("Circuit breaker closed for LLM replica", extra={'replica': replica.url})
+        replica.breaker.record_success(call.trial)
+        call.trial = False
+
+    def record_latency(self, language_model: LanguageModel, seconds: float):
+        self._latencies[language_model].append(seconds)
+
+    def hedge_delay(self, language_model: LanguageModel) -> Optional[float]:
+        """
+        How long to wait for a call before sending a hedged duplicate.
+
+        Returns:
+            The configured latency percentile of recent calls (at least
+            hedge_min_delay), or None if hedging is off or there are too few
+            samples or replicas to hedge.
+        """
+        if not self.hedging or len(self.pool(language_model).replicas) < 2:
+            return None
+        samples = self._latencies.get(language_model)
+        if not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return max(ordered[index], self.hedge_min_delay)
+
+    def _ensure_probing(self):
+        if self.health_interval <= 0 or self._probe_pid == os.getpid():
+            return
+        self._probe_pid = os.getpid()
+        self._probe_task = asyncio.get_running_loop().create_task(self._probe_forever())
+
+    async def _probe(self, replica: Replica):
+        ok = False
+        try:
+            client = llm_client.client_for(replica.url)
+            response = await client.get(replica.origin + self.health_path, timeout=self.health_timeout)
+            ok = response.status_code == 200
+        except Exception:
+            pass
+
+        if ok:
+            replica.probe_failures = 0
+            if not replica.healthy:
+                replica.healthy = True
+                logger.info("LLM replica back in rotation", extra={'replica': replica.url})
+            return
+
+        replica.probe_failures += 1
+        if replica.healthy and replica.probe_failures >= self.failure_threshold:
+            replica.healthy = False
+            logger.warning("LLM replica taken out of rotation", extra={'replica': replica.url})
+
+    async def _probe_forever(self):
+        while True:
+            replicas = {id(r): r for pool in self.pools.values() for r in pool.replicas}
+            await asyncio.gather(*(self._probe(r) for r in replicas.values()))
+            await asyncio.sleep(self.health_interval)
+
+    def status(self) -> Dict[str, List[dict]]:
+        """Snapshot of every pool, for diagnostics."""
+        return {
+            model.value: [r.to_dict() for r in pool.replicas]
+            for model, pool in self.pools.items()
+        }
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+class ResponseCache:
+    """
+    Replay cache for model replies, for load tests, demos and scripted pilots.
+
+    Replies are keyed on a hash of the model, use case, prompt type, sampling
+    options and the full message list, and stored in a small SQLite file so
+    every gunicorn worker shares them and they survive restarts. Entries
+    expire after ttl seconds and the least recently used ones are evicted
+    beyond max_entries. Disabled unless RESPONSE_CACHE_ENABLED is set, so
+    real participants always get freshly generated replies.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.path = None
+        self.max_entries = 10000
+        self.ttl = 7 * 24 * 3600.0
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', False)
+        self.path = app.config.get('RESPONSE_CACHE_PATH') or os.path.join(app.instance_path, 'response_cache.db')
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self._local = threading.local()
+        app.extensions['response_cache'] = self
+        if self.enabled:
+            logger.info("Response replay cache enabled", extra={'path': self.path})
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_last_used ON response_cache (last_used)')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(use_case: str, prompt_type: str, payload: Dict[str, Any]) -> str:
+        """
+        Fingerprint a model request.
+
+        Args:
+            use_case: The chat session's use case.
+            prompt_type: The chat session's prompt type.
+            payload: The request payload; its model, options and messages are hashed.
+
+        Returns:
+            A hex SHA-256 digest.
+        """
+        fingerprint = {
+            'use_case': use_case,
+            'prompt_type': prompt_type,
+            'model': payload.get('model'),
+            'options': payload.get('options'),
+            'messages': payload.get('messages')
+        }
+        encoded = json.dumps(fingerprint, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached reply for key, or None if it is missing or expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute('SELECT value, created_at FROM response_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if now - created_at > self.ttl:
+            connection.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+            return None
+        connection.execute('UPDATE response_cache SET last_used = ? WHERE key = ?', (now, key))
+        return json.loads(value)
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a reply and evict the least recently used entries beyond max_entries."""
+        if not self.enabled:
+            return
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO response_cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now, now)
+        )
+        connection.execute(
+            'DELETE FROM response_cache WHERE created_at < ? OR key IN ('
+            'SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (now - self.ttl, self.max_entries)
+        )
+
+response_cache = ResponseCache()
@@ -0,0 +1,91 @@
+from typing import Dict, List
+
+from sqlalchemy import Integer, cast, func, insert, select, text
+
+from app import db
+from app.models import ChatSession, Question, QuestionType, Response, ResponseSummary
+
+_KEY_COLUMNS = ['language_model', 'prompt_type', 'use_case', 'question_id']
+
+def _upsert_statement(rows: List[Dict]):
+    """INSERT ... ON CONFLICT that adds the rows' totals to the existing ones."""
+    dialect = db.session.get_bind(ResponseSummary).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    statement = dialect_insert(ResponseSummary).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=_KEY_COLUMNS,
+        set_={
+            'n': ResponseSummary.n + statement.excluded.n,
+            'total': ResponseSummary.total + statement.excluded.total,
+            'total_squares': ResponseSummary.total_squares + statement.excluded.total_squares
+        }
+    )
+
+def record_answers(chat_session: ChatSession, answers: Dict[int, int]):
+    """
+    Add a post-survey's Likert answers to the summary, in the caller's transaction.
+
+    Args:
+        chat_session: The session the survey was about; any object with
+            language_model, prompt_type and use_case.
+        answers: Likert answers by question id.
+    """
+    if not answers:
+        return
+    rows = [{
+        'language_model': chat_session.language_model,
+        'prompt_type': chat_session.prompt_type,
+        'use_case': chat_session.use_case,
+        'question_id': question_id,
+        'n': 1,
+        'total': value,
+        'total_squares': value * value
+    } for question_id, value in answers.items()]
+
+    statement = _upsert_statement(rows)
+    if statement is not None:
+        db.session.execute(statement)
+        return
+
+    # No portable upsert on other databases; update, then insert what did not exist yet
+    for row in rows:
+        updated = ResponseSummary.query.filter_by(**{key: row[key] for key in _KEY_COLUMNS}).update({
+            'n': ResponseSummary.n + row['n'],
+            'total': ResponseSummary.total + row['total'],
+            'total_squares': ResponseSummary.total_squares + row['total_squares']
+        }, synchronize_session=False)
+        if not updated:
+            db.session.execute(insert(ResponseSummary), [row])
+
+def rebuild() -> int:
+    """
+    Recompute the whole summary from the response table, e.g. after a backfill.
+
+    On PostgreSQL the table is locked for the duration, so submissions made
+    meanwhile wait and are counted exactly once.
+
+    Returns:
+        The number of summary rows written.
+    """
+    if db.session.get_bind(ResponseSummary).dialect.name == 'postgresql':
+        db.session.execute(text('LOCK TABLE response_summary IN EXCLUSIVE MODE'))
+    db.session.query(ResponseSummary).delete(synchronize_session=False)
+
+    value = cast(Response.answer, Integer)
+    aggregates = select(
+        ChatSession.language_model, ChatSession.prompt_type, ChatSession.use_case, Response.question_id,
+        func.count(Response.id), func.sum(value), func.sum(value * value)
+    ).join(ChatSession, Response.chat_session_id == ChatSession.id) \
+        .join(Question, Response.question_id == Question.id) \
+        .where(Question.type == QuestionType.LIKERT.value) \
+        .group_by(ChatSession.language_model, ChatSession.prompt_type, ChatSession.use_case, Response.question_id)
+    result = db.session.execute(
+        insert(ResponseSummary).from_select(_KEY_COLUMNS + ['n', 'total', 'total_squares'], aggregates)
+    )
+    db.session.commit()
+    return result.rowcount
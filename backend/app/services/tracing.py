@@ -0,0 +1,300 @@
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.logging_config import get_logger, sampled
+
+logger = get_logger(__name__)
+
+SERVICE_NAME = 'chatbot-eval-backend'
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+# Longest SQL statement text kept on a span
+_MAX_STATEMENT_LENGTH = 2000
+
+class Span:
+    """One timed operation of a trace."""
+    __slots__ = ('name', 'span_id', 'parent_id', 'kind', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name: str, parent_id: Optional[str], kind: int, attributes: Dict):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_otlp(self, trace_id: str) -> Dict:
+        span = {
+            'traceId': trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items() if value is not None],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.error is not None:
+            span['status'] = {'code': STATUS_ERROR, 'message': self.error}
+        return span
+
+class Trace:
+    """The spans of one sampled request, under its root span."""
+
+    def __init__(self, trace_id: str, root: Span, max_spans: int):
+        self.trace_id = trace_id
+        self.root = root
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+# The trace and span that new spans of this request are children of; None when not sampled
+_active: contextvars.ContextVar[Optional[Tuple[Trace, Span]]] = contextvars.ContextVar('trace_span', default=None)
+
+def _trace_id(correlation_id: str) -> str:
+    """The correlation ID as a 16 byte trace ID, so a trace can be found by it."""
+    try:
+        return uuid.UUID(correlation_id).hex
+    except ValueError:
+        return hashlib.sha256(correlation_id.encode('utf-8')).hexdigest()[:32]
+
+def _otlp_attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+class Tracer:
+    """
+    Head-sampled request tracing with OTLP JSON output.
+
+    A request is sampled when it starts, by hashing its correlation ID,
+    so all requests of a correlated flow are traced alike and the trace
+    ID is derived from the correlation ID. Unsampled requests only pay for
+    a context variable lookup at each instrumentation point. A sampled
+    request's spans (the handler, SQL statements and commits, LLM calls
+    and JSON serialization) are collected in memory and exported when the
+    response is closed, as one OTLP ExportTraceServiceRequest document:
+    appended as a line to trace_file if set, and kept in a ring buffer of
+    the last buffer_size traces of this process for /api/traces.
+    """
+
+    def __init__(self, app=None):
+        self.sample_rate = 0.0
+        self.buffer_size = 100
+        self.max_spans = 1000
+        self.trace_file: Optional[str] = None
+        self._buffer: deque = deque(maxlen=self.buffer_size)
+        self._file_lock = threading.Lock()
+        self._instrumented = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('TRACE_SAMPLE_RATE', self.sample_rate)
+        self.buffer_size = app.config.get('TRACE_BUFFER_SIZE', self.buffer_size)
+        self.max_spans = app.config.get('TRACE_MAX_SPANS', self.max_spans)
+        self.trace_file = app.config.get('TRACE_FILE') or None
+        self._buffer = deque(maxlen=self.buffer_size)
+        if not self._instrumented:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            event.listen(Session, 'before_commit', _before_commit)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+            self._instrumented = True
+        if self.sample_rate > 0:
+            app.json = TracedJSONProvider(app)
+        app.extensions['tracer'] = self
+
+    def start_trace(self, name: str, correlation_id: str, **attributes) -> Optional[Trace]:
+        """
+        Start the root span of a request, if the request is sampled.
+
+        Args:
+            name: The span name, e.g. the method and route.
+            correlation_id: The request's correlation ID, which decides the sampling.
+            attributes: Span attributes.
+
+        Returns:
+            The Trace, or None if the request is not traced.
+        """
+        if self.sample_rate <= 0 or not sampled(correlation_id, self.sample_rate):
+            _active.set(None)
+            return None
+        root = Span(name, None, SPAN_KIND_SERVER, dict(attributes, correlation_id=correlation_id))
+        trace = Trace(_trace_id(correlation_id), root, self.max_spans)
+        _active.set((trace, root))
+        return trace
+
+    def finish_trace(self, trace: Trace):
+        """End a request's root span and export its trace."""
+        current = _active.get()
+        if current is not None and current[0] is trace:
+            _active.set(None)
+        root = trace.root
+        if root.end is not None:
+            return
+        root.end = time.time_ns()
+        if trace.dropped:
+            root.set_attribute('dropped_spans', trace.dropped)
+        trace.add(root)
+        document = {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [span.to_otlp(trace.trace_id) for span in trace.spans]
+                }]
+            }]
+        }
+        self._buffer.append(document)
+        if self.trace_file:
+            try:
+                line = json.dumps(document) + '\n'
+                with self._file_lock, open(self.trace_file, 'a') as f:
+                    f.write(line)
+            except OSError as e:
+                logger.warning(f"Writing trace failed: {e}")
+
+    def start_span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Optional[Span]:
+        """
+        Start a child of the current span without making it current.
+
+        Returns:
+            The span, to pass to end_span, or None if the request is not traced.
+        """
+        current = _active.get()
+        if current is None:
+            return None
+        return Span(name, current[1].span_id, kind, attributes)
+
+    def end_span(self, span: Optional[Span], error: Optional[str] = None):
+        """End a span from start_span; None is ignored."""
+        current = _active.get()
+        if span is None or span.end is not None:
+            return
+        span.end = time.time_ns()
+        span.error = error
+        if current is not None:
+            current[0].add(span)
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+        """
+        Time a block as a child of the current span; spans started inside are its children.
+
+        Yields:
+            The span, or None if the request is not traced.
+        """
+        current = _active.get()
+        if current is None:
+            yield None
+            return
+        trace, parent = current
+        span = Span(name, parent.span_id, kind, attributes)
+        _active.set((trace, span))
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            _active.set((trace, parent))
+            span.end = time.time_ns()
+            trace.add(span)
+
+    def recent(self, trace_id: Optional[str] = None) -> List[Dict]:
+        """
+        The traces kept by this process, oldest first.
+
+        Args:
+            trace_id: Only the trace with this ID (or correlation ID).
+        """
+        documents = list(self._buffer)
+        if trace_id is None:
+            return documents
+        trace_id = _trace_id(trace_id) if len(trace_id) != 32 else trace_id
+        return [document for document in documents
+                if document['resourceSpans'][0]['scopeSpans'][0]['spans'][0]['traceId'] == trace_id]
+
+tracer = Tracer()
+
+class TracedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with response serialization traced."""
+
+    def dumps(self, obj, **kwargs):
+        with tracer.span('json.dumps'):
+            return super().dumps(obj, **kwargs)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is None:
+        return
+    span = tracer.start_span(
+        'db.' + (statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'query'),
+        SPAN_KIND_CLIENT,
+        **{'db.system': conn.dialect.name, 'db.statement': statement[:_MAX_STATEMENT_LENGTH]}
+    )
+    conn.info.setdefault('trace_spans', []).append(span)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    if spans:
+        span = spans.pop()
+        if cursor is not None and cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute('db.rows', cursor.rowcount)
+        tracer.end_span(span)
+
+def _handle_error(context):
+    connection = context.connection
+    spans = connection.info.get('trace_spans') if connection is not None else None
+    if spans:
+        tracer.end_span(spans.pop(), f"{context.original_exception.__class__.__name__}: {context.original_exception}")
+
+def _before_commit(session):
+    if _active.get() is not None:
+        session.info['trace_commit'] = tracer.start_span('db.session.commit', SPAN_KIND_CLIENT)
+
+def _after_commit(session):
+    tracer.end_span(session.info.pop('trace_commit', None))
+
+def _after_soft_rollback(session, previous_transaction):
+    tracer.end_span(session.info.pop('trace_commit', None), 'rolled back')
@@ -3,11 +3,148 @@ import os
 
 load_dotenv()
 
+DEFAULT_LLM_URL = "http://137.250.171.154:11434/api/chat"
+
+def _url_list(value):
+    return [url.strip() for url in value.split(',') if url.strip()]
+
+def _route_percentages(value):
+    """Parse 'rule=percent,rule=percent' into a dict."""
+    percentages = {}
+    for item in _url_list(value):
+        rule, _, percent = item.rpartition('=')
+        percentages[rule.strip()] = float(percent)
+    return percentages
+
 class Config:
     file_path_local_db = os.path.abspath(os.getcwd())+"\\instance\\chatbot_eval.db"
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     SQLALCHEMY_DATABASE_URI =  os.getenv('DATABASE_URL', 'sqlite:///'+file_path_local_db)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool of each process, for the primary and the replica; create_app
+    # leaves the sizing options out for engines that do not use a queue pool
+    DB_POOL_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+    # Optional read replica; read-only routes query it instead of the primary
+    DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+
+    # Comma-separated replica URLs per language model; calls go to the least-loaded healthy one
+    LLM_REPLICAS = {
+        'llama': _url_list(os.getenv('LLM_REPLICAS_LLAMA', DEFAULT_LLM_URL)),
+        'r1': _url_list(os.getenv('LLM_REPLICAS_R1', DEFAULT_LLM_URL))
+    }
+    LLM_HEALTH_PATH = os.getenv('LLM_HEALTH_PATH', '/api/tags')
+    LLM_HEALTH_INTERVAL = float(os.getenv('LLM_HEALTH_INTERVAL', '15'))  # 0 disables probing
+    LLM_HEALTH_TIMEOUT = float(os.getenv('LLM_HEALTH_TIMEOUT', '3'))
+    LLM_HEALTH_FAILURE_THRESHOLD = int(os.getenv('LLM_HEALTH_FAILURE_THRESHOLD', '2'))
+
+    # Per-replica circuit breaker: fail fast after consecutive errors, retry after the reset timeout
+    LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv('LLM_BREAKER_FAILURE_THRESHOLD', '3'))
+    LLM_BREAKER_RESET_TIMEOUT = float(os.getenv('LLM_BREAKER_RESET_TIMEOUT', '30'))
+
+    # Hedged requests: duplicate a call to a second replica once it exceeds the latency percentile
+    LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+    LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '95'))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+    LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '2'))
+
+    # Pooled HTTP client for the LLM backends
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '20'))
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '10'))
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv('LLM_POOL_KEEPALIVE_EXPIRY', '30'))
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+    LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '100'))
+
+    # Concurrent LLM calls per model across all workers on the host, plus a bounded wait queue
+    ADMISSION_LIMITS = {
+        'llama': int(os.getenv('ADMISSION_LIMIT_LLAMA', '4')),
+        'r1': int(os.getenv('ADMISSION_LIMIT_R1', '4'))
+    }
+    # Waiting requests hold a gunicorn thread (4 workers x 2 threads), so the queue stays
+    # well below the free threads and the wait short; a queue size of 0 rejects right away
+    ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '2'))
+    ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', '3'))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))
+    ADMISSION_LOCK_DIR = os.getenv('ADMISSION_LOCK_DIR')
+
+    # Background generation workers per process for /api/chat/jobs
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+    JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '300'))
+
+    # Group commit for chat messages: concurrent turns share one INSERT and commit
+    MESSAGE_GROUP_COMMIT = os.getenv('MESSAGE_GROUP_COMMIT', 'true').lower() == 'true'
+    MESSAGE_FLUSH_INTERVAL = float(os.getenv('MESSAGE_FLUSH_INTERVAL', '0.002'))
+    MESSAGE_FLUSH_MAX_BATCH = int(os.getenv('MESSAGE_FLUSH_MAX_BATCH', '100'))
+
+    # Ready-made opening messages kept per (model, use case, prompt type); 0 generates them per session
+    OPENER_POOL_SIZE = int(os.getenv('OPENER_POOL_SIZE', '2'))
+    OPENER_MAX_AGE = float(os.getenv('OPENER_MAX_AGE', str(24 * 3600)))
+    OPENER_REFILL_INTERVAL = float(os.getenv('OPENER_REFILL_INTERVAL', '30'))
+
+    # /api/analytics: bootstrap processes per backend process (0 runs inline) and resamples per comparison
+    ANALYTICS_WORKERS = int(os.getenv('ANALYTICS_WORKERS', '2'))
+    ANALYTICS_BOOTSTRAP_SAMPLES = int(os.getenv('ANALYTICS_BOOTSTRAP_SAMPLES', '2000'))
+    ANALYTICS_CONFIDENCE = float(os.getenv('ANALYTICS_CONFIDENCE', '0.95'))
+
+    # Bulk export endpoint (/api/export); disabled unless a bearer token is set
+    EXPORT_TOKEN = os.getenv('EXPORT_TOKEN')
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+    # Seconds between checks of the survey question catalog version in each process
+    QUESTION_CACHE_TTL = float(os.getenv('QUESTION_CACHE_TTL', '60'))
+
+    # Replay cache for model replies; only for load tests, demos and scripted pilots, never real participants
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '10000'))
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+
+    # Number of chat sessions whose history is kept in memory per process
+    CHAT_HISTORY_CACHE_SIZE = int(os.getenv('CHAT_HISTORY_CACHE_SIZE', '1024'))
+
+    # Chat session configurations and evaluation progress records kept per process
+    PROGRESS_CACHE_SIZE = int(os.getenv('PROGRESS_CACHE_SIZE', '4096'))
+
+    # Prompt token budget per language model and how to trim histories that exceed it
+    CONTEXT_TOKEN_BUDGET_DEFAULT = int(os.getenv('CONTEXT_TOKEN_BUDGET_DEFAULT', '6000'))
+    CONTEXT_TOKEN_BUDGETS = {
+        'llama': int(os.getenv('CONTEXT_TOKEN_BUDGET_LLAMA', '6000')),
+        'r1': int(os.getenv('CONTEXT_TOKEN_BUDGET_R1', '6000'))
+    }
+    CONTEXT_STRATEGY = os.getenv('CONTEXT_STRATEGY', 'drop_oldest')  # 'drop_oldest' or 'summarize'
+
+    # Percentage of successful, fast requests whose start and completion are logged, overridable
+    # per route rule (e.g. "/api/health=0,/api/chat/jobs/<job_id>=10"); requests with a status of at
+    # least REQUEST_LOG_ALWAYS_STATUS or slower than REQUEST_LOG_SLOW_MS are always logged
+    REQUEST_LOG_SAMPLE_RATE = float(os.getenv('REQUEST_LOG_SAMPLE_RATE', '100'))
+    REQUEST_LOG_SAMPLE_RATES = _route_percentages(os.getenv('REQUEST_LOG_SAMPLE_RATES', '/api/health=0,/api/metrics=0'))
+    REQUEST_LOG_ALWAYS_STATUS = int(os.getenv('REQUEST_LOG_ALWAYS_STATUS', '400'))
+    REQUEST_LOG_SLOW_MS = float(os.getenv('REQUEST_LOG_SLOW_MS', '1000'))
+
+    # Directory where each process writes its metrics for /api/metrics to sum, and how often
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+    # Bearer token for /api/metrics and /api/traces; both are disabled unless it is set
+    OBSERVABILITY_TOKEN = os.getenv('OBSERVABILITY_TOKEN')
+
+    # SQL statements slower than this are logged; per-request statement counts go in response headers,
+    # and routes over their declared query budget fail in testing or with QUERY_BUDGET_ENFORCE
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+    QUERY_STATS_HEADERS = os.getenv('QUERY_STATS_HEADERS', 'true').lower() == 'true'
+    QUERY_BUDGET_ENFORCE = os.getenv('QUERY_BUDGET_ENFORCE', 'false').lower() == 'true'
+
+    # Percentage of requests traced, sampled by correlation ID (0 disables tracing), and where
+    # traces go: the last TRACE_BUFFER_SIZE per process for /api/traces, plus TRACE_FILE if set
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+    TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '100'))
+    TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '1000'))
+    TRACE_FILE = os.getenv('TRACE_FILE')
 
     @staticmethod
     def as_dict():
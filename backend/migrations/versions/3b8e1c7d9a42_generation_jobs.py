@@ -0,0 +1,43 @@
+"""generation jobs
+
+Revision ID: 3b8e1c7d9a42
+Revises: f602b5dda221
+Create Date: 2026-10-18 10:12:45.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e1c7d9a42'
+down_revision: Union[str, None] = 'f602b5dda221'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('generation_job',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('chat_session_id', sa.Integer(), nullable=False),
+    sa.Column('user_message_id', sa.Integer(), nullable=False),
+    sa.Column('bot_message_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('reasoning', sa.Text(), nullable=True),
+    sa.Column('error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['bot_message_id'], ['chat_message.id'], ),
+    sa.ForeignKeyConstraint(['chat_session_id'], ['chat_session.id'], ),
+    sa.ForeignKeyConstraint(['user_message_id'], ['chat_message.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_generation_job_status'), 'generation_job', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generation_job_status'), table_name='generation_job')
+    op.drop_table('generation_job')
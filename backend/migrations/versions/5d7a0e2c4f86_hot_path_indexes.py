@@ -0,0 +1,34 @@
+"""hot path indexes
+
+Revision ID: 5d7a0e2c4f86
+Revises: 9c4f2a6e5b13
+Create Date: 2026-10-18 14:02:37.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7a0e2c4f86'
+down_revision: Union[str, None] = '9c4f2a6e5b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_question_active_survey_type_order', 'question', ['active', 'survey_type', 'order'], unique=False)
+    op.create_index('ix_response_chat_session_id', 'response', ['chat_session_id'], unique=False)
+    op.create_index('ix_response_eval_id', 'response', ['eval_id'], unique=False)
+    op.create_index('ix_chat_session_evaluation_id_completed', 'chat_session', ['evaluation_id', 'completed'], unique=False)
+    op.create_index('ix_chat_message_chat_session_id_id', 'chat_message', ['chat_session_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_message_chat_session_id_id', table_name='chat_message')
+    op.drop_index('ix_chat_session_evaluation_id_completed', table_name='chat_session')
+    op.drop_index('ix_response_eval_id', table_name='response')
+    op.drop_index('ix_response_chat_session_id', table_name='response')
+    op.drop_index('ix_question_active_survey_type_order', table_name='question')
@@ -0,0 +1,37 @@
+"""prepared openers
+
+Revision ID: 9c4f2a6e5b13
+Revises: 3b8e1c7d9a42
+Create Date: 2026-10-18 11:05:12.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f2a6e5b13'
+down_revision: Union[str, None] = '3b8e1c7d9a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('prepared_opener',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('language_model', sa.String(length=36), nullable=False),
+    sa.Column('use_case', sa.String(length=36), nullable=False),
+    sa.Column('prompt_type', sa.String(length=36), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('reasoning', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_prepared_opener_cell', 'prepared_opener', ['language_model', 'use_case', 'prompt_type', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_prepared_opener_cell', table_name='prepared_opener')
+    op.drop_table('prepared_opener')
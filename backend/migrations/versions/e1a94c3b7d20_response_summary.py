@@ -0,0 +1,55 @@
+"""response summary
+
+Revision ID: e1a94c3b7d20
+Revises: 5d7a0e2c4f86
+Create Date: 2026-10-18 15:20:44.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a94c3b7d20'
+down_revision: Union[str, None] = '5d7a0e2c4f86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    summary = op.create_table('response_summary',
+    sa.Column('language_model', sa.String(length=36), nullable=False),
+    sa.Column('prompt_type', sa.String(length=36), nullable=False),
+    sa.Column('use_case', sa.String(length=36), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('n', sa.Integer(), nullable=False),
+    sa.Column('total', sa.BigInteger(), nullable=False),
+    sa.Column('total_squares', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ),
+    sa.PrimaryKeyConstraint('language_model', 'prompt_type', 'use_case', 'question_id')
+    )
+
+    # Fill it from the Likert answers already stored, as flask rebuild-response-summary does
+    response = sa.table('response',
+        sa.column('id', sa.Integer), sa.column('question_id', sa.Integer),
+        sa.column('chat_session_id', sa.Integer), sa.column('answer', sa.String))
+    chat_session = sa.table('chat_session',
+        sa.column('id', sa.Integer), sa.column('language_model', sa.String),
+        sa.column('prompt_type', sa.String), sa.column('use_case', sa.String))
+    question = sa.table('question', sa.column('id', sa.Integer), sa.column('type', sa.String))
+    value = sa.cast(response.c.answer, sa.Integer)
+    keys = [chat_session.c.language_model, chat_session.c.prompt_type, chat_session.c.use_case, response.c.question_id]
+    op.execute(summary.insert().from_select(
+        ['language_model', 'prompt_type', 'use_case', 'question_id', 'n', 'total', 'total_squares'],
+        sa.select(*keys, sa.func.count(response.c.id), sa.func.sum(value), sa.func.sum(value * value))
+        .select_from(response.join(chat_session, response.c.chat_session_id == chat_session.c.id)
+                     .join(question, response.c.question_id == question.c.id))
+        .where(question.c.type == 'likert')
+        .group_by(*keys)
+    ))
+
+
+def downgrade() -> None:
+    op.drop_table('response_summary')
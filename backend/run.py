@@ -1,4 +1,10 @@
+import os
+import sys
+
+import click
+
 from app import create_app, db
+from app.services import export
 
 app = create_app()
 
@@ -7,3 +13,59 @@ def init_db():
     """Initialize the database."""
     db.create_all()
     print('Database initialized.')
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """EXPLAIN the hot queries and fail if any of them needs a full table scan."""
+    from app.query_plans import check_query_plans
+    failures = 0
+    for name, plan, uses_index in check_query_plans():
+        print(f"{'ok  ' if uses_index else 'SCAN'} {name}")
+        for line in plan:
+            print(f"       {line}")
+        failures += not uses_index
+    if failures:
+        print(f'{failures} queries fall back to a full table scan.')
+        raise SystemExit(1)
+    print('All queries use an index.')
+
+@app.cli.command("rebuild-response-summary")
+def rebuild_response_summary_command():
+    """Recompute the per-cell answer summary from all responses, e.g. after a backfill."""
+    from app.services import response_summary
+    rows = response_summary.rebuild()
+    print(f'Response summary rebuilt: {rows} cells.')
+
+@app.cli.command("export-data")
+@click.option('--format', 'export_format', type=click.Choice(export.FORMATS), default='ndjson')
+@click.option('--table', 'tables', multiple=True, type=click.Choice(list(export.EXPORT_TABLES)),
+              help='Table to export; repeat for several. Default: all.')
+@click.option('--since', type=click.DateTime(), help='Only rows created or changed since this time.')
+@click.option('--output', help='File for ndjson (default export.ndjson, - for stdout), directory for csv and parquet (default export).')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched per round trip.')
+def export_data_command(export_format, tables, since, output, batch_size):
+    """Export the study dataset without loading it into memory."""
+    tables = list(tables) or list(export.EXPORT_TABLES)
+
+    if export_format == 'ndjson':
+        output = output or 'export.ndjson'
+        stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8')
+        try:
+            for line in export.iter_ndjson(tables, since, batch_size):
+                stream.write(line)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        return
+
+    directory = output or 'export'
+    os.makedirs(directory, exist_ok=True)
+    for table in tables:
+        path = os.path.join(directory, f'{table}.{export_format}')
+        if export_format == 'csv':
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                for chunk in export.iter_csv(table, since, batch_size):
+                    f.write(chunk)
+        else:
+            export.write_parquet(table, path, since, batch_size)
+        click.echo(f'Wrote {path}', err=True)
@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import Question, QuestionType
+from app.services.question_catalog import question_catalog
 
 def seed_questions():
     pre_survey_questions = [
@@ -207,6 +208,7 @@ def seed_questions():
         db.session.add(question)
 
     db.session.commit()
+    question_catalog.invalidate()
 
 if __name__ == '__main__':
     app = create_app()
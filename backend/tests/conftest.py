@@ -0,0 +1,29 @@
+import tempfile
+
+import pytest
+
+from app import create_app, db
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DATABASE_REPLICA_URL = None
+    METRICS_DIR = tempfile.mkdtemp(prefix='chatbot-eval-metrics-')
+    LLM_HEALTH_INTERVAL = 0
+    OPENER_POOL_SIZE = 0
+    JOB_WORKERS = 0
+    REQUEST_LOG_SAMPLE_RATE = 0
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        yield app
+        db.session.remove()
+        db.drop_all(bind_key=None)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,29 @@
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app import create_app, db
+from app.db_routing import REPLICA_BIND, engine_options
+from config import Config
+from conftest import TestConfig
+
+def test_in_memory_primary_and_replica():
+    class InMemoryReplicaConfig(TestConfig):
+        DATABASE_REPLICA_URL = 'sqlite://'
+
+    app = create_app(InMemoryReplicaConfig)
+    with app.app_context():
+        assert isinstance(db.engines[None].pool, StaticPool)
+        assert isinstance(db.engines[REPLICA_BIND].pool, StaticPool)
+    assert app.test_client().get('/api/health').status_code == 200
+
+def test_engine_options_keep_pool_sizing_for_queue_pools(tmp_path):
+    options = engine_options('postgresql://user@db/chatbot_eval', Config.DB_POOL_OPTIONS)
+    assert options == Config.DB_POOL_OPTIONS
+
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'chatbot_eval.db'}"
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        pool = db.engines[None].pool
+        assert isinstance(pool, QueuePool)
+        assert pool.size() == Config.DB_POOL_OPTIONS['pool_size']
@@ -0,0 +1,32 @@
+import logging
+
+import pytest
+
+from app.models import Question
+from app.query_stats import QueryBudgetExceeded, query_budget
+
+def _add_route(app, budget: int):
+    """A route that runs two SQL statements under the given budget."""
+    @query_budget(budget)
+    def two_statements():
+        Question.query.count()
+        Question.query.first()
+        return {'status': 'ok'}
+    app.add_url_rule('/test/two-statements', view_func=two_statements)
+
+def test_going_over_the_budget_fails_the_request(app, client):
+    _add_route(app, budget=1)
+    with pytest.raises(QueryBudgetExceeded, match='ran 2 SQL statements, over its budget of 1'):
+        client.get('/test/two-statements')
+
+def test_statement_count_reaches_header_and_log(app, client, caplog):
+    _add_route(app, budget=2)
+    app.config['REQUEST_LOG_SAMPLE_RATE'] = 100
+    caplog.set_level(logging.INFO)
+
+    response = client.get('/test/two-statements')
+    assert response.status_code == 200
+    assert response.headers['X-DB-Statements'] == '2'
+    assert float(response.headers['X-DB-Time-Ms']) >= 0
+    completed = [r for r in caplog.records if r.getMessage().startswith('Request completed')]
+    assert [r.db_statements for r in completed] == [2]
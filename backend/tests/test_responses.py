@@ -0,0 +1,21 @@
+from app import db
+from app.models import Question, QuestionType, Response
+
+def test_malformed_likert_answers_are_rejected(client):
+    likert = Question(text='How helpful was the chatbot?', type=QuestionType.LIKERT.value, order=1, survey_type='post')
+    text = Question(text='Anything else?', type=QuestionType.TEXT.value, order=2, survey_type='post', required=False)
+    db.session.add_all([likert, text])
+    db.session.commit()
+
+    response = client.post('/api/responses', json={'type': 'post', 'responses': [
+        {'questionId': likert.id, 'answer': 'very'},
+        {'questionId': text.id, 'answer': 'very'}
+    ]})
+    assert response.status_code == 400
+    assert response.get_json()['invalid_questions'] == [likert.id]
+    assert Response.query.count() == 0
+
+def test_unknown_survey_types_are_rejected(client):
+    assert client.get('/api/questions?type=pre').status_code == 200
+    assert client.get('/api/questions?type=Pre').status_code == 400
+    assert client.post('/api/responses', json={'type': 'mid', 'responses': []}).status_code == 400
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from app import db
+from app.models import (
+    ChatMessage, ChatSession, Evaluation, LanguageModel, PromptType, Question, QuestionType, Response, UseCase, User
+)
+
+def _seed_evaluation(sessions: int) -> int:
+    """An evaluation with the given number of chat sessions, each with messages and a response."""
+    question = Question(text='How helpful was the chatbot?', type=QuestionType.LIKERT.value, order=1, survey_type='post')
+    user = User(session_id=f'user-{sessions}')
+    evaluation = Evaluation(user=user, start_time=datetime.utcnow())
+    db.session.add_all([question, evaluation])
+    db.session.flush()
+    for i in range(sessions):
+        chat_session = ChatSession(
+            evaluation=evaluation, use_case=UseCase.HEALTH_CARE.value, language_model=LanguageModel.LLAMA.value,
+            prompt_type=PromptType.STANDARD.value, start_time=datetime.utcnow()
+        )
+        db.session.add_all([
+            chat_session,
+            ChatMessage(chat_session=chat_session, sender='bot', content=f'Hello {i}'),
+            ChatMessage(chat_session=chat_session, sender='user', content=f'Hi {i}'),
+            Response(question=question, chat_session=chat_session, eval_id=evaluation.id, answer='4')
+        ])
+    db.session.commit()
+    return evaluation.id
+
+def test_results_statements_do_not_grow_with_sessions(client):
+    statements = {}
+    for sessions in (1, 8):
+        evaluation_id = _seed_evaluation(sessions)
+        response = client.get(f'/api/results/{evaluation_id}')
+        assert response.status_code == 200
+        assert len(response.get_json()['chat_sessions']) == sessions
+        statements[sessions] = int(response.headers['X-DB-Statements'])
+    assert statements[1] == statements[8]
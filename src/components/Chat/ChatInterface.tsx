@@ -3,7 +3,7 @@ import { useEvaluationStore } from '../../store/evaluationStore';
 import { ChatMessage } from './ChatMessage';
 import { Send, AlertCircle } from 'lucide-react';
 import { LoadingSpinner } from '../common/LoadingSpinner';
-import { sendChatMessage } from '../../services/api';
+import { waitForChatJob } from '../../services/api';
 
 export const ChatInterface: React.FC = () => {
   const [message, setMessage] = useState('');
@@ -22,14 +22,13 @@ export const ChatInterface: React.FC = () => {
   } = useEvaluationStore();
 
   /**
-   * Sends an initial message to introduce the bot to the user.
-   * This is triggered when a new chat session starts.
+   * Shows the bot's opening message, which the backend started generating
+   * (or took ready-made from its pool) when the chat session was created.
    */
   const sendInitialMessage = async () => {
     try {
       setIsSendInitialMessage(true);
-      const initialMessage = "Introduce yourself to the user";
-      const response = await sendChatMessage(currentChatSessionId!, initialMessage, []);
+      const response = await waitForChatJob(activeChatSession!.openingJob);
 
       if (response.success) {
         addChatMessage({
@@ -39,8 +38,8 @@ export const ChatInterface: React.FC = () => {
         });
       }
     } catch (error) {
-      console.error('Failed to send initial message:', error);
-      setError('Failed to send initial message');
+      console.error('Failed to load initial message:', error);
+      setError('Failed to load initial message');
     }
     finally{
       setIsSendInitialMessage(false);
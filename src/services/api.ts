@@ -1,47 +1,93 @@
-import { ChatMessage } from "../types";
-
 const API_BASE =
   import.meta.env.VITE_USE_LOCAL_API === "true"
     ? "http://localhost:5000/api"
     : "http://137.250.171.247:5000/api";
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+/**
+ * Waits for a queued bot reply, polling its job until it is done or failed.
+ * Jobs that are already finished, like a pre-generated opening message,
+ * resolve without a request.
+ *
+ * @param job - The job as returned by the backend.
+ * @returns A promise resolving to { success, message } or { success: false, error }.
+ */
+export const waitForChatJob = async (job: any): Promise<any> => {
+  while (job.status === "queued" || job.status === "running") {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const poll = await fetch(`${API_BASE}/chat/jobs/${job.job_id}`);
+    if (!poll.ok) {
+      throw new Error("Failed to fetch reply");
+    }
+    job = await poll.json();
+  }
+
+  return job.status === "done"
+    ? { success: true, message: job.message }
+    : { success: false, error: job.error };
+};
+
+export type ChatStreamEvent =
+  | { type: "reasoning" | "content"; delta: string }
+  | {
+      type: "done";
+      message: {
+        id: number;
+        content: string;
+        reasoning?: string;
+        timestamp: string;
+      };
+    }
+  | { type: "error"; error: string };
+
 /**
- * Sends a chat message to the server along with the chat history.
+ * Sends a chat message and streams the bot reply as it is generated.
+ * The server answers with newline-delimited JSON events.
  * @param chatSessionId - The ID of the current chat session.
  * @param message - The message to be sent.
- * @param history - The chat history containing previous messages.
- * @returns A promise resolving to the server's response.
+ * @param onEvent - Called for every streamed event, in order.
+ * @returns A promise resolving once the stream has ended.
  */
-export const sendChatMessage = async (
+export const streamChatMessage = async (
   chatSessionId: number,
   message: string,
-  history: ChatMessage[]
-): Promise<any> => {
-  try {
-    const response = await fetch(`${API_BASE}/chat/message`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({
-        chatSessionId,
-        message,
-        history: history.map((msg) => ({
-          role: msg.sender === "user" ? "user" : "assistant",
-          content: msg.text,
-        })),
-      }),
-    });
+  onEvent: (event: ChatStreamEvent) => void
+): Promise<void> => {
+  const response = await fetch(`${API_BASE}/chat/message/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({
+      chatSessionId,
+      message,
+    }),
+  });
 
-    if (!response.ok) {
-      const error = await response.json();
-      throw new Error(error.error || "Failed to send message");
-    }
+  if (!response.ok || !response.body) {
+    const error = await response.json();
+    throw new Error(error.error || "Failed to send message");
+  }
 
-    return await response.json();
-  } catch (error) {
-    throw error;
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+
+    for (const line of lines) {
+      if (line.trim()) onEvent(JSON.parse(line));
+    }
   }
+
+  if (buffer.trim()) onEvent(JSON.parse(buffer));
 };
 
 /**
@@ -2,8 +2,8 @@ import { v4 as uuidv4 } from "uuid";
 import { create } from "zustand";
 import {
   getNextTopic,
-  sendChatMessage,
   startChatSession,
+  streamChatMessage,
 } from "../services/api";
 import type {
   ChatMessage,
@@ -96,6 +96,7 @@ interface EvaluationStore extends EvaluationState {
     answer: string | number
   ) => void;
   addChatMessage: (message: Omit<ChatMessage, "id" | "timestamp">) => void;
+  updateLastChatMessage: (update: Partial<Omit<ChatMessage, "id">>) => void;
   startEvaluation: () => Promise<void>;
   startNextChatSession: () => Promise<void>;
   endCurrentChatSession: () => void;
@@ -297,6 +298,36 @@ export const useEvaluationStore = create<EvaluationStore>((set, get) => ({
       return state;
     }),
 
+  /**
+   * Updates the most recent message of the active chat session in place.
+   * Used to grow a bot message while its reply is being streamed.
+   * @param update - The fields to overwrite on the last message.
+   */
+  updateLastChatMessage: (update) =>
+    set((state) => {
+      const chatHistory = state.activeChatSession?.chatHistory;
+      if (!state.activeChatSession || !chatHistory?.length) return state;
+
+      const updatedActiveChatSession = {
+        ...state.activeChatSession,
+        chatHistory: [
+          ...chatHistory.slice(0, -1),
+          { ...chatHistory[chatHistory.length - 1], ...update },
+        ],
+      };
+
+      const updatedChatSessions = state.chatSessions.map((session) =>
+        session.id === updatedActiveChatSession.id
+          ? updatedActiveChatSession
+          : session
+      );
+
+      return {
+        activeChatSession: updatedActiveChatSession,
+        chatSessions: updatedChatSessions,
+      };
+    }),
+
   /**
    * Starts the evaluation process by creating an evaluation session.
    * Fetches pre-survey questions and sets the current step to "pre-survey".
@@ -367,6 +398,7 @@ export const useEvaluationStore = create<EvaluationStore>((set, get) => ({
         completed: false,
         chatHistory: [],
         responses: [],
+        openingJob: chatSessionData.opening,
       };
 
       // Update state with the new chat session
@@ -463,23 +495,39 @@ export const useEvaluationStore = create<EvaluationStore>((set, get) => ({
         });
       }
 
-      // Send message to API
-      const result = await sendChatMessage(
+      // Stream the bot reply into the chat history as it arrives
+      let text = "";
+      let reasoning = "";
+      let started = false;
+      const render = () => {
+        if (!started) {
+          started = true;
+          set({ loading: false });
+          get().addChatMessage({ sender: "bot", text, reasoning });
+        } else {
+          get().updateLastChatMessage({ text, reasoning });
+        }
+      };
+
+      await streamChatMessage(
         currentChatSessionId,
         message,
-        activeChatSession.chatHistory
+        (event) => {
+          if (event.type === "content") {
+            text += event.delta;
+            render();
+          } else if (event.type === "reasoning") {
+            reasoning += event.delta;
+            render();
+          } else if (event.type === "done") {
+            text = event.message.content;
+            reasoning = event.message.reasoning ?? "";
+            render();
+          } else {
+            set({ error: event.error });
+          }
+        }
       );
-
-      if (result.success) {
-        // Add bot message to chat history
-        get().addChatMessage({
-          sender: "bot",
-          text: result.message.content,
-          reasoning: result.message.reasoning,
-        });
-      } else {
-        set({ error: result.error });
-      }
     } catch (error) {
       set({
         error:
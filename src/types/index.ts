@@ -34,6 +34,7 @@ export interface ChatSession {
   completed: boolean;
   chatHistory: ChatMessage[];
   responses: SurveyResponse[];
+  openingJob?: any;
 }
 
 export interface EvaluationState {